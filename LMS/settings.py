@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_from_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.profiling.ProfilingMiddleware', # first, so it measures everything below it
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,12 +82,33 @@ WSGI_APPLICATION = 'LMS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# db.sqlite3 unless DATABASE_URL is set, e.g. postgres://lms:secret@db:5432/lms. postgres connections are kept
+# open for DATABASE_CONN_MAX_AGE seconds, or taken from a pool of DATABASE_POOL_SIZE per process when set
+# (needs psycopg[pool]). DATABASE_REPLICA_URLS is a comma separated list of read replicas, views marked with
+# @read_from_replica read from them, see base/routers.py
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 0))
+
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {'default': database_from_url(os.environ['DATABASE_URL'], DATABASE_CONN_MAX_AGE, DATABASE_POOL_SIZE)}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
-}
+
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    # tests read the replicas through the test database of the primary
+    DATABASES[alias] = database_from_url(url.strip(), DATABASE_CONN_MAX_AGE, DATABASE_POOL_SIZE) | {'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['base.routers.ReplicaRouter']
+# reads stay on the primary while testing, see base/testrunner.py
+TEST_RUNNER = 'base.testrunner.ReplicaMirrorRunner'
 
 
 # Password validation
@@ -104,6 +129,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 work factor, None is django's default. load test environments can lower it so logins do not spend all
+# the cpu on hashing, existing hashes are re-hashed with the configured count at the next login
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0)) or None
+PASSWORD_HASHERS = [
+    'base.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -122,6 +158,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# uploaded files are stored once per distinct content, see base/storage.py
+STORAGES = {
+    'default': {'BACKEND': 'base.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -129,19 +174,68 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'base.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 2,
+    'DEFAULT_PAGINATION_CLASS': 'base.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# api tokens (base/tokens.py) expire AUTH_TOKEN_TTL seconds after they were issued. login hands out the user's
+# newest token again until it is AUTH_TOKEN_ROTATE_AFTER seconds old, a refreshed token keeps working for
+# AUTH_TOKEN_GRACE seconds so requests already on their way do not fail
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 7 * 24 * 3600))
+AUTH_TOKEN_ROTATE_AFTER = 24 * 3600
+AUTH_TOKEN_GRACE = 60
+
+# per view timing, sql and response size of a sample of the requests (base/profiling.py), shown to admins
+# on profiling/ and profiling/?output=prometheus
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', '') == '1',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0.1)),
+    'DUPLICATE_THRESHOLD': 5,
 }
 
+# tokens and their users are cached in process for LOCAL_TTL seconds and, when SHARED_CACHE names a cache
+# every process shares (redis, memcached, not the default LocMemCache), there for SHARED_TTL seconds,
+# see base/authentication.py
+AUTH_CACHE = {
+    'LOCAL_SIZE': 10000,
+    'LOCAL_TTL': 10,
+    'SHARED_CACHE': os.environ.get('AUTH_SHARED_CACHE') or None,
+    'SHARED_TTL': 300,
+}
+
+# upper bound of the ?page_size= a client can ask for
+MAX_PAGE_SIZE = 100
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-EMAIL_HOST_USER = 
-EMAIL_HOST_PASSWORD = 
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+
+# mails are queued in the outbox and delivered by `python manage.py send_queued_mail --loop`
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_LEASE = 600 # a batch is sent outside of any transaction, other workers leave it alone this long
+
+# resumable uploads (base/uploads.py)
+UPLOAD_MAX_SIZE = 2 * 1024 ** 3
+UPLOAD_CHUNK_SIZE = 5 * 1024 ** 2
+UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 ** 2
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# downloads (base/downloads.py): None lets django send files, 'x-accel-redirect' hands them to nginx through an
+# internal location that maps DOWNLOAD_ACCEL_PREFIX onto MEDIA_ROOT, 'x-sendfile' to apache or lighttpd
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD') or None
+DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# progress reports up to this size are mailed as attachments, bigger ones as a signed link valid for REPORT_LINK_MAX_AGE seconds
+REPORT_ATTACHMENT_MAX_SIZE = 1024 ** 2
+REPORT_LINK_MAX_AGE = 7 * 24 * 3600
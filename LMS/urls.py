@@ -22,15 +22,33 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('register/',RegisterUserView.as_view(),name = 'register'),
     path('login/',login, name = 'login'),
+    path('token/refresh/',token_refresh_api,name='token_refresh_api'),
     path('course/',CourseView.as_view(),name = 'courseview'),
     path('coursedetail/<int:pk>/',CoursedetailView.as_view(),name = 'course'),
     path('enrollment/',EnrollmentView.as_view(),name='Enrollment'),
+    path('enrollment/bulk/',bulk_enrollment_api,name='bulk_enrollment_api'),
     path('assessment/', AssessmentListCreateView.as_view(), name='assessment-list-create'),
+    path('assessment/<int:pk>/file/',assessment_file_api,name='assessment_file_api'),
     path('submission/',SubmissionView.as_view(),name = 'Submission'),
+    path('submission/<int:pk>/file/',submission_file_api,name='submission_file_api'),
+    path('assessment/<int:pk>/submissions/',submission_archive_api,name='submission_archive_api'),
     path('sponsor/',SponsorView.as_view(),name='Sponsor'),
     path('student-progress/',StudentProgressView.as_view(),name='studentprogress'),
+    path('student-progress/upload/',gradebook_upload_api,name='gradebook_upload_api'),
     path('admin-dashboard/',admin_dashboard_api,name='admin_dashboard_api'),
+    path('admin-dashboard/enrollments/',enrollment_analytics_api,name='enrollment_analytics_api'),
+    path('admin-dashboard/submissions/',submission_analytics_api,name='submission_analytics_api'),
+    path('admin-dashboard/sponsorships/',sponsorship_analytics_api,name='sponsorship_analytics_api'),
+    path('mail-status/',mail_status_api,name='mail_status_api'),
+    path('auth-cache-status/',auth_cache_status_api,name='auth_cache_status_api'),
+    path('profiling/',profiling_api,name='profiling_api'),
+    path('export/<str:dataset>/',export_api,name = 'export_api'),
     path('sponsor-dashboard/',sponsor_dashboard_api,name='sponsor_dashboard_api'),
+    path('uploads/',upload_start_api,name='upload_start_api'),
+    path('uploads/<uuid:pk>/',upload_api,name='upload_api'),
     path('progress-report/',ProgressReportView.as_view(),name='progress_report'),
-    path('notification/',NotificationView.as_view(),name='Notification')
+    path('progress-report/download/<str:token>/',progress_report_download_api,name='progress_report_download'),
+    path('notification/',NotificationView.as_view(),name='Notification'),
+    path('notification/unread/',notification_unread_api,name='notification_unread'),
+    path('notification/read/',notification_mark_read_api,name='notification_mark_read')
 ]
@@ -9,4 +9,8 @@ admin.site.register(Assessment)
 admin.site.register(Submission)
 admin.site.register(StudentProgress)
 admin.site.register(Notification)
-admin.site.register(Sponsor)
\ No newline at end of file
+admin.site.register(Sponsor)
+admin.site.register(OutboundEmail)
+admin.site.register(Broadcast)
+admin.site.register(Blob)
+admin.site.register(AuthToken)
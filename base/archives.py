@@ -0,0 +1,100 @@
+import hashlib
+import os
+import re
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import Submission
+
+BLOCK_SIZE = 64 * 1024 # bytes read from storage at a time
+CACHE_TTL = getattr(settings, 'SUBMISSION_ARCHIVE_CACHE_TTL', 3600)
+UNSAFE = re.compile(r'[^\w.-]+')
+
+
+def manifest_key(assessment_id, rows):
+    # the key covers every submission, file and username that goes into the manifest, a change in any process
+    # gives a new key instead of needing every process's cache to be told
+    version = hashlib.sha256(repr(rows).encode()).hexdigest()
+    return f'submission-archive:{assessment_id}:{version}'
+
+
+def manifest(assessment_id):
+    """[(entry name, stored file name, size)] of the submissions of an assessment, oldest first.
+
+    Entries are named after the student, a second submission of the same student gets a -2 suffix. The
+    submissions are read every time, the sizes need a stat per file and are cached with the manifest.
+    """
+    rows = list(
+        Submission.objects.filter(assessment_id=assessment_id).exclude(add_file='')
+        .order_by('submitted_at', 'id').values_list('id', 'submitted_by__username', 'add_file')
+    )
+    key = manifest_key(assessment_id, rows)
+    entries = cache.get(key)
+    if entries is not None:
+        return entries
+    entries, taken = [], set()
+    for _, username, name in rows:
+        try:
+            size = default_storage.size(name)
+        except OSError:
+            continue # the file is gone, the archive is still useful without it
+        stem, extension = UNSAFE.sub('_', username), os.path.splitext(name)[1]
+        entry, number = f'{stem}{extension}', 1
+        while entry in taken:
+            number += 1
+            entry = f'{stem}-{number}{extension}'
+        taken.add(entry)
+        entries.append((entry, name, size))
+    cache.set(key, entries, CACHE_TTL)
+    return entries
+
+
+class _Sink:
+    # zipfile writes here, the stream below hands out whatever was written since it last looked
+    def __init__(self):
+        self.pieces = []
+        self.position = 0
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.pieces)
+        self.pieces = []
+        return data
+
+
+def archive_stream(entries):
+    """The zip of `entries` (see manifest()) as a stream of bytes, read from storage BLOCK_SIZE at a time.
+
+    The archive is never held in memory or on disk: zipfile writes to an unseekable sink, so every entry gets
+    a data descriptor after its content instead of a header that is patched afterwards. Files are stored
+    without compression, submissions are mostly pdfs, images and archives that do not get smaller.
+    """
+    return (piece for piece in _pieces(entries) if piece)
+
+
+def _pieces(entries):
+    # zipfile output as it is written, including empty pieces
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for entry, name, size in entries:
+            info = zipfile.ZipInfo(entry)
+            info.file_size = size
+            with default_storage.open(name, 'rb') as source, archive.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as target:
+                while block := source.read(BLOCK_SIZE):
+                    target.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain() # the central directory
@@ -0,0 +1,179 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import AuthToken
+
+# in-process entries are not told about changes made by other processes, so they live for a few seconds only.
+# the shared cache is invalidated by the signals in base/signals.py and can keep entries much longer
+DEFAULTS = {
+    'LOCAL_SIZE': 10000, # tokens kept per process, least recently used go first
+    'LOCAL_TTL': 10,
+    'SHARED_CACHE': None, # alias in CACHES of a cache every process shares, None to use the in-process cache only
+    'SHARED_TTL': 300,
+}
+CONFIG = {**DEFAULTS, **getattr(settings, 'AUTH_CACHE', {})}
+KEY_PREFIX = 'auth:token:'
+
+
+class LocalCache:
+    """Thread safe LRU with a time to live, for one process."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedCache:
+    """One of the django CACHES (redis, memcached, ...), shared by every process."""
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, value):
+        caches[self.alias].set(key, value, self.ttl)
+
+    def delete_many(self, keys):
+        caches[self.alias].delete_many(keys)
+
+    def clear(self):
+        pass # other entries live in the same cache, these expire on their own
+
+
+class TokenCache:
+    """Tokens with their user, looked up in each tier in order; a hit in a later tier fills the earlier ones.
+
+    Counts hits per tier and misses for stats(). The counts are per process.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = [0] * len(self.tiers)
+            self.misses = 0
+
+    def key(self, token_key):
+        # the raw token never ends up in a cache key, where it could show up in monitoring of the cache server
+        return KEY_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+    def get(self, token_key):
+        key = self.key(token_key)
+        for number, tier in enumerate(self.tiers):
+            token = tier.get(key)
+            if token is not None:
+                for earlier in self.tiers[:number]:
+                    earlier.set(key, token)
+                with self.lock:
+                    self.hits[number] += 1
+                # callers get their own copy, the cached one is shared by every request
+                return copy.copy(token)
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, token):
+        key = self.key(token.key)
+        for tier in self.tiers:
+            tier.set(key, token)
+
+    def invalidate(self, token_keys):
+        keys = [self.key(token_key) for token_key in token_keys]
+        if keys:
+            for tier in self.tiers:
+                tier.delete_many(keys)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self):
+        with self.lock:
+            hits, misses = list(self.hits), self.misses
+        lookups = sum(hits) + misses
+        return {
+            'lookups': lookups,
+            'hits': {type(tier).__name__: count for tier, count in zip(self.tiers, hits)},
+            'misses': misses,
+            'hit_rate': round(sum(hits) / lookups, 4) if lookups else None,
+        }
+
+
+def _tiers(config=CONFIG):
+    tiers = [LocalCache(config['LOCAL_SIZE'], config['LOCAL_TTL'])]
+    if config['SHARED_CACHE']:
+        # a per process cache would only be invalidated in the process that changed the token or user, the
+        # others would keep accepting it for SHARED_TTL
+        if isinstance(caches[config['SHARED_CACHE']], LocMemCache):
+            raise ImproperlyConfigured(f"AUTH_CACHE['SHARED_CACHE'] {config['SHARED_CACHE']!r} is a LocMemCache, which is not shared between processes")
+        tiers.append(SharedCache(config['SHARED_CACHE'], config['SHARED_TTL']))
+    return tiers
+
+
+token_cache = TokenCache(_tiers())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with expiring tokens that skips the token JOIN user query for tokens seen recently."""
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token)
+        else:
+            token.user = copy.copy(token.user)
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # checked on cached tokens too, they carry their expiry with them
+        if token.expired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        return token.user, token
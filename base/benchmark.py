@@ -0,0 +1,279 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from itertools import count
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from rest_framework.test import APIClient
+
+from . import rollups, search, uploads
+from .authentication import token_cache
+from .counters import reconcile
+from .downloads import report_token
+from .models import *
+
+BUDGETS_FILE = Path(__file__).resolve().parent / 'perf_budgets.json'
+ROLES = [role for role, _ in User.ROLE_CHOICES]
+PASSWORD = 'benchmark-password'
+
+# default size of the synthetic dataset, every value can be overridden
+SCALE = {
+    'users_per_role': 20,
+    'courses': 10,
+    'enrollments_per_student': 3,
+    'assessments_per_course': 3,
+    'submissions_per_assessment': 5,
+    'sponsorships_per_sponsor': 5,
+}
+
+
+def seed_dataset(seed=0, **scale):
+    """Fill the (test) database with a synthetic dataset and return the users the routes run as.
+
+    The first user of every role gets a real password and a token, the others are bulk inserted.
+    """
+    scale = {**SCALE, **scale}
+    rng = random.Random(seed)
+    unusable = make_password(None)
+
+    actors = {}
+    for role in ROLES:
+        actors[role] = User.objects.create_user(email=f'{role}@bench.test', username=f'bench_{role}', password=PASSWORD, role=role)
+        AuthToken.objects.create(user=actors[role])
+    User.objects.bulk_create([
+        User(email=f'{role}{number}@bench.test', username=f'{role}{number}', password=unusable, role=role)
+        for role in ROLES for number in range(1, scale['users_per_role'])
+    ])
+    users = {role: list(User.objects.filter(role=role).order_by('id')) for role in ROLES}
+    NotificationCounter.objects.bulk_create([NotificationCounter(user=user) for group in users.values() for user in group], ignore_conflicts=True)
+
+    start = date(2025, 1, 1)
+    Course.objects.bulk_create([
+        Course(title=f'Course {number}', difficulty=rng.choice(['easy', 'intermediate', 'hard']),
+               instructor=rng.choice(users['instructor']), start_date=start + timedelta(days=number), end_date=start + timedelta(days=number + 90))
+        for number in range(scale['courses'])
+    ])
+    courses = list(Course.objects.order_by('id'))
+    courses[0].instructor = actors['instructor'] # the benchmarked instructor always owns something
+    courses[0].save()
+
+    Enrollment.objects.bulk_create([
+        Enrollment(course=course, student=student, instructor_id=course.instructor_id, status='enrolled')
+        for student in users['student']
+        for course in rng.sample(courses, min(scale['enrollments_per_student'], len(courses)))
+    ])
+    Enrollment.objects.get_or_create(course=courses[0], student=actors['student'], defaults={'instructor': actors['instructor'], 'status': 'enrolled'})
+
+    Assessment.objects.bulk_create([
+        Assessment(file='assessment.pdf', course=course, title=f'{course.title} assessment {number}', description='synthetic',
+                   due_date=course.start_date + timedelta(days=30), max_score=100, created_by_id=course.instructor_id)
+        for course in courses for number in range(scale['assessments_per_course'])
+    ])
+    enrolled = {}
+    for course_id, student_id in Enrollment.objects.values_list('course_id', 'student_id'):
+        enrolled.setdefault(course_id, []).append(student_id)
+
+    submissions, grades = [], []
+    for assessment in Assessment.objects.order_by('id'):
+        students = enrolled.get(assessment.course_id, [])
+        for student_id in rng.sample(students, min(scale['submissions_per_assessment'], len(students))):
+            submissions.append(Submission(assessment=assessment, add_file='answer.pdf', submitted_by_id=student_id))
+            grades.append(StudentProgress(assessment=assessment, student_id=student_id, instructor_id=assessment.created_by_id,
+                                          is_completed=True, marks_obtained=rng.randint(0, assessment.max_score)))
+    Submission.objects.bulk_create(submissions)
+    StudentProgress.objects.bulk_create(grades)
+
+    Sponsor.objects.bulk_create([
+        Sponsor(sponsor=sponsor, student=student, amount=rng.randint(100, 10000), transaction_id=f'tx-{sponsor.id}-{student.id}')
+        for sponsor in users['sponsor']
+        for student in rng.sample(users['student'], min(scale['sponsorships_per_sponsor'], len(users['student'])))
+    ])
+    Sponsor.objects.get_or_create(sponsor=actors['sponsor'], student=actors['student'], defaults={'amount': 500, 'transaction_id': 'tx-bench'})
+    reconcile()
+    for metric in rollups.SOURCES:
+        rollups.rebuild(metric)
+    search.get_backend().rebuild()
+    return actors
+
+
+def _dataset(actors):
+    course = Course.objects.filter(instructor=actors['instructor']).order_by('id').first()
+    assessment = Assessment.objects.filter(course=course).order_by('id').first()
+    # seeded rows only name their files, the download routes need ones that exist
+    assessment.file = SimpleUploadedFile('brief.pdf', b'%PDF-1.4 ' + bytes(256 * 1024))
+    assessment.save(update_fields=['file'])
+    # not the student's own sponsorship, the progress_report route replaces that report before the download runs
+    sponsorship = Sponsor.objects.exclude(student=actors['student']).order_by('id').first()
+    sponsorship.report_file = SimpleUploadedFile('report.pdf', b'%PDF-1.4 benchmark report')
+    sponsorship.save(update_fields=['report_file'])
+    return {
+        'actors': actors,
+        'course': course,
+        'assessment': assessment,
+        'submission': Submission.objects.create(
+            assessment=assessment, submitted_by=actors['student'], add_file=SimpleUploadedFile('essay.pdf', b'%PDF-1.4 essay'),
+        ),
+        'upload': uploads.start(actors['student'], 'submission', assessment, 'bench.bin', 1024),
+        'report': report_token(sponsorship),
+        'numbers': count(),
+    }
+
+
+def _register(data, user):
+    number = next(data['numbers'])
+    return {'email': f'new{number}@bench.test', 'username': f'new{number}', 'password': PASSWORD, 'role': user.role}
+
+
+def _bulk_enrollment(data, user):
+    students = User.objects.filter(role='student').order_by('id').values_list('id', flat=True)
+    return {'enrollments': [{'student': student, 'course': data['course'].pk} for student in students]}
+
+
+def _gradebook(data, user):
+    students = Enrollment.objects.filter(course=data['course']).order_by('student_id').values_list('student_id', flat=True)
+    lines = ['student,assessment,marks'] + [f"{student},{data['assessment'].pk},{student % 100}" for student in students]
+    return {'gradebook': SimpleUploadedFile('grades.csv', '\n'.join(lines).encode(), content_type='text/csv')}
+
+
+def _progress_report(data, user):
+    return {'student': data['actors']['student'].id, 'report_file': SimpleUploadedFile('report.pdf', b'%PDF-1.4 benchmark report')}
+
+
+# how every named route in LMS/urls.py is called: (method, url kwargs, request body builder)
+# a route that is missing here makes the test suite fail, so new routes always get a budget
+ROUTES = {
+    'register': ('post', None, _register),
+    'login': ('post', None, lambda data, user: {'email': user.email, 'password': PASSWORD}),
+    'token_refresh_api': ('post', None, None),
+    'courseview': ('get', None, None),
+    'course': ('get', lambda data: {'pk': data['course'].pk}, None),
+    'Enrollment': ('get', None, None),
+    'bulk_enrollment_api': ('post', None, _bulk_enrollment),
+    'assessment-list-create': ('get', None, None),
+    'assessment_file_api': ('get', lambda data: {'pk': data['assessment'].pk}, None),
+    'Submission': ('get', None, None),
+    'submission_file_api': ('get', lambda data: {'pk': data['submission'].pk}, None),
+    'submission_archive_api': ('get', lambda data: {'pk': data['assessment'].pk}, None),
+    'Sponsor': ('get', None, None),
+    'studentprogress': ('get', None, None),
+    'gradebook_upload_api': ('post', None, _gradebook),
+    'admin_dashboard_api': ('get', None, None),
+    'enrollment_analytics_api': ('get', None, lambda data, user: {'start': '2024-01-01'}),
+    'submission_analytics_api': ('get', None, lambda data, user: {'start': '2024-01-01'}),
+    'sponsorship_analytics_api': ('get', None, lambda data, user: {'start': '2024-01-01'}),
+    'mail_status_api': ('get', None, None),
+    'auth_cache_status_api': ('get', None, None),
+    'profiling_api': ('get', None, lambda data, user: {'output': 'prometheus'}),
+    'export_api': ('get', lambda data: {'dataset': 'grades'}, lambda data, user: {'output': 'csv', 'compress': '1'}),
+    'sponsor_dashboard_api': ('get', None, None),
+    'upload_start_api': ('post', None, lambda data, user: {'target': 'submission', 'assessment': data['assessment'].pk, 'filename': 'video.mp4', 'size': 10 ** 8}),
+    'upload_api': ('get', lambda data: {'pk': data['upload'].pk}, None),
+    'progress_report': ('post', None, _progress_report),
+    'progress_report_download': ('get', lambda data: {'token': data['report']}, None),
+    'Notification': ('get', None, None),
+    'notification_unread': ('get', None, None),
+    'notification_mark_read': ('post', None, None),
+}
+# posted as json instead of multipart because their bodies are nested
+JSON_ROUTES = {'bulk_enrollment_api', 'upload_start_api'}
+# routes only one role can use, calling them as the other roles would only measure the 403
+ROUTE_ROLES = {'sponsor_dashboard_api': ['sponsor']}
+
+
+def url_names():
+    # named routes of LMS/urls.py, the django admin is not ours to budget
+    return [pattern.name for pattern in get_resolver().url_patterns if getattr(pattern, 'name', None)]
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))]
+
+
+def _response_size(response):
+    if getattr(response, 'streaming', False):
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def _count_queries(captured):
+    # transaction control (BEGIN/COMMIT in autocommit mode, savepoints inside the test suite's transaction)
+    # is left out so the test suite and `manage.py benchmark_routes` count the same statements
+    control = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+    return sum(1 for query in captured if not query['sql'].startswith(control))
+
+
+def run_routes(actors, repeat=10, names=None):
+    """Call every route as every role (or the ones in ROUTE_ROLES) `repeat` times.
+
+    Returns {"<route>:<role>": {status, queries, p50_ms, p95_ms, bytes}}. The query count is the one of the
+    first call, later calls only feed the latency percentiles.
+    """
+    data = _dataset(actors)
+    results = {}
+    for name in names or url_names():
+        method, kwargs, body = ROUTES[name]
+        url = reverse(name, kwargs=kwargs(data) if kwargs else None)
+        request_format = None if method == 'get' else 'json' if name in JSON_ROUTES else 'multipart'
+        for role, user in actors.items():
+            if role not in ROUTE_ROLES.get(name, ROLES):
+                continue
+            token = AuthToken.objects.select_related('user').filter(user=user).latest('created_at')
+            # query counts are those of a client that is already authenticated, whichever route ran before
+            token_cache.set(token)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            timings = []
+            queries = status = size = None
+            for attempt in range(repeat):
+                payload = body(data, user) if body else None
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, payload, format=request_format)
+                    size = _response_size(response)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if attempt == 0:
+                    queries, status = _count_queries(captured), response.status_code
+            results[f'{name}:{role}'] = {
+                'status': status,
+                'queries': queries,
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(_percentile(timings, 95), 3),
+                'bytes': size,
+            }
+    return results
+
+
+def load_budgets(path=BUDGETS_FILE):
+    with open(path) as budgets:
+        return json.load(budgets)
+
+
+def over_budget(results, budgets, check_latency=True):
+    """List of human readable budget violations, empty when every route is within budget."""
+    failures = []
+    for key, result in sorted(results.items()):
+        budget = budgets.get(key)
+        if budget is None:
+            failures.append(f"{key}: no budget stored")
+            continue
+        if result['queries'] > budget['queries']:
+            failures.append(f"{key}: {result['queries']} queries, budget is {budget['queries']}")
+        if check_latency and result['p95_ms'] > budget['p95_ms']:
+            failures.append(f"{key}: p95 {result['p95_ms']}ms, budget is {budget['p95_ms']}ms")
+    return failures
+
+
+def budgets_from(results, latency_headroom=3, min_p95_ms=50):
+    # query budgets are exact, latency gets headroom because timings are noisy between machines
+    return {
+        key: {'queries': result['queries'], 'p95_ms': max(min_p95_ms, round(result['p95_ms'] * latency_headroom))}
+        for key, result in sorted(results.items())
+    }
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Counter, Course, Enrollment, User
+
+CACHE_KEY = 'counters'
+CACHE_TTL = getattr(settings, 'COUNTERS_CACHE_TTL', 300)
+
+USERS = 'users'
+ACTIVE_COURSES = 'courses:active'
+ENROLLMENTS = 'enrollments'
+
+
+def role_key(role):
+    return f'users:role:{role}'
+
+
+def course_key(course_id):
+    return f'enrollments:course:{course_id}'
+
+
+def compute(key):
+    """The real value of a counter, straight from the tables."""
+    if key == USERS:
+        return User.objects.count()
+    if key == ACTIVE_COURSES:
+        return Course.objects.filter(is_active=True).count()
+    if key == ENROLLMENTS:
+        return Enrollment.objects.count()
+    if key.startswith('users:role:'):
+        return User.objects.filter(role=key.rsplit(':', 1)[1]).count()
+    if key.startswith('enrollments:course:'):
+        return Enrollment.objects.filter(course_id=int(key.rsplit(':', 1)[1])).count()
+    raise KeyError(key)
+
+
+def add(key, delta):
+    """Apply `delta` to a counter inside the current transaction, so it commits or rolls back with the change."""
+    if not delta:
+        return
+    if not Counter.objects.filter(key=key).update(value=F('value') + delta):
+        # first change of this counter, the write that triggered it is already in the table
+        Counter.objects.get_or_create(key=key, defaults={'value': compute(key)})
+    # dropped now for this connection and again after commit, in case another request cached the old value meanwhile
+    cache.delete(CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def get_many(keys):
+    """Values of `keys`, served from the cache and filled from the Counter table (or the real tables) on a miss."""
+    values = cache.get(CACHE_KEY) or {}
+    missing = [key for key in keys if key not in values]
+    absent = {}
+    if missing:
+        stored = dict(Counter.objects.filter(key__in=missing).values_list('key', 'value'))
+        unknown = [key for key in missing if key not in stored]
+        # course ids come straight from the dashboard's query string, only real courses get a stored counter
+        courses = {
+            course_key(course_id) for course_id in Course.objects.filter(
+                id__in=[int(key.rsplit(':', 1)[1]) for key in unknown if key.startswith('enrollments:course:')]
+            ).values_list('id', flat=True)
+        } if unknown else set()
+        for key in unknown:
+            if key.startswith('enrollments:course:') and key not in courses:
+                absent[key] = 0 # no such course, so no enrollments either
+            else:
+                stored[key] = Counter.objects.get_or_create(key=key, defaults={'value': compute(key)})[0].value
+        values.update(stored)
+        cache.set(CACHE_KEY, values, CACHE_TTL)
+    return {key: values[key] if key in values else absent[key] for key in keys}
+
+
+def reconcile():
+    """Recompute every counter from the tables and fix the ones that drifted (bulk inserts skip the signals).
+
+    Returns {key: (stored, real)} for every counter that was wrong.
+    """
+    real = {USERS: User.objects.count(), ACTIVE_COURSES: Course.objects.filter(is_active=True).count(), ENROLLMENTS: Enrollment.objects.count()}
+    for role, _ in User.ROLE_CHOICES:
+        real[role_key(role)] = 0
+    for role, total in User.objects.order_by().values_list('role').annotate(total=Count('id')):
+        real[role_key(role)] = total
+    for course_id, total in Enrollment.objects.order_by().values_list('course_id').annotate(total=Count('id')):
+        real[course_key(course_id)] = total
+
+    drift = {}
+    with transaction.atomic():
+        stored = dict(Counter.objects.select_for_update().values_list('key', 'value'))
+        for key, value in stored.items():
+            if key.startswith('enrollments:course:') and key not in real:
+                real[key] = 0 # course lost all its enrollments
+        changed = [Counter(key=key, value=value) for key, value in real.items() if stored.get(key) != value]
+        drift = {counter.key: (stored.get(counter.key), counter.value) for counter in changed}
+        Counter.objects.bulk_create(changed, update_conflicts=True, unique_fields=['key'], update_fields=['value'])
+    cache.delete(CACHE_KEY)
+    return drift
@@ -0,0 +1,52 @@
+from django.db.models import Count, DecimalField, F, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from .models import Assessment, Enrollment, Sponsor, StudentProgress
+
+PERCENTAGE = DecimalField(max_digits=12, decimal_places=4)
+
+
+def _count(queryset, field='pk'):
+    # counts rows of a correlated queryset as a scalar subquery so that it can be used as an annotation
+    counted = queryset.order_by().annotate(_group=Value(1)).values('_group').annotate(total=Count(field, distinct=True)).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def sponsored_students(sponsor, progress_percentage=None, courses_enrolled=None):
+    """Sponsorships of `sponsor` annotated with the dashboard stats of each student.
+
+    Everything is computed by the database in a single query, no matter how many students are sponsored.
+    """
+    enrolled_courses = Enrollment.objects.filter(student=OuterRef(OuterRef('student'))).values('course_id')
+
+    sponsorships = (
+        Sponsor.objects.filter(sponsor=sponsor)
+        .annotate(
+            student_name=F('student__username'),
+            courses_enrolled=_count(Enrollment.objects.filter(student=OuterRef('student')), 'course_id'),
+            total_assessments=_count(Assessment.objects.filter(course_id__in=enrolled_courses)),
+            completed_assessments=_count(StudentProgress.objects.filter(student=OuterRef('student'), is_completed=True)),
+        )
+        .annotate(
+            # NullIf keeps students without assessments at 0 instead of dividing by zero
+            progress_percentage=Coalesce(
+                Round(
+                    Cast(Cast(F('completed_assessments'), FloatField()) * 100 / NullIf(F('total_assessments'), 0), PERCENTAGE),
+                    2,
+                ),
+                Value(0),
+                output_field=PERCENTAGE,
+            )
+        )
+        .order_by('id')
+    )
+
+    #filters are applied in sql so we never pull unwanted students into python
+    if progress_percentage is not None:
+        sponsorships = sponsorships.filter(progress_percentage=progress_percentage)
+    if courses_enrolled is not None:
+        sponsorships = sponsorships.filter(courses_enrolled=courses_enrolled)
+
+    return sponsorships.values(
+        'student_id', 'student_name', 'total_assessments', 'completed_assessments',
+        'progress_percentage', 'amount', 'courses_enrolled',
+    )
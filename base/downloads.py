@@ -0,0 +1,127 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from .storage import digest_of
+
+BLOCK_SIZE = 64 * 1024
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# None serves the file from django, 'x-accel-redirect' (nginx) or 'x-sendfile' (apache, lighttpd) leave it to the proxy
+OFFLOAD = getattr(settings, 'DOWNLOAD_OFFLOAD', None)
+# internal location of the proxy that maps onto MEDIA_ROOT, used with x-accel-redirect
+ACCEL_PREFIX = getattr(settings, 'DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+REPORT_LINK_MAX_AGE = getattr(settings, 'REPORT_LINK_MAX_AGE', 7 * 24 * 3600) # seconds a mailed report link works
+REPORT_SALT = 'base.downloads.report'
+
+
+class _Slice:
+    # file object limited to `length` bytes from where it is, without fileno so servers stream it instead of
+    # using sendfile on the whole file
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def etag(field_file, stat):
+    # content addressed names already carry the hash of the content
+    digest = digest_of(field_file.name)
+    return quote_etag(digest if digest else f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def byte_range(header, size):
+    """(first, last) of a single `Range: bytes=` header, None to send everything, False when it cannot be served."""
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None # several ranges or garbage, sending the whole file is always allowed
+    first, last = match.groups()
+    if first == '':
+        first, last = max(0, size - int(last)), size - 1 # the last n bytes
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        return False
+    return first, last
+
+
+def serve(request, field_file):
+    """Response with the file of `field_file` that honours Range, If-Range and If-None-Match.
+
+    Full files go out through FileResponse so a server with wsgi.file_wrapper can use sendfile, with
+    DOWNLOAD_OFFLOAD the proxy sends them instead and django only checks the permissions.
+    """
+    try:
+        path = field_file.path
+        stat = os.stat(path)
+    except (ValueError, FileNotFoundError):
+        return None
+    tag = etag(field_file, stat)
+    filename = os.path.basename(field_file.name)
+
+    if tag in parse_etags(request.headers.get('If-None-Match', '')) or request.headers.get('If-None-Match') == '*':
+        response = HttpResponseNotModified()
+        response['ETag'] = tag
+        return response
+
+    if OFFLOAD:
+        # blobs have no extension on disk, the proxy would not know the type of the file
+        response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if OFFLOAD == 'x-accel-redirect':
+            relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = ACCEL_PREFIX.rstrip('/') + '/' + relative
+        else:
+            response['X-Sendfile'] = path
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['ETag'] = tag
+        return response
+
+    wanted = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (if_range is None or if_range == tag):
+        wanted = byte_range(request.headers['Range'], stat.st_size)
+    if wanted is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    file = open(path, 'rb')
+    if wanted:
+        first, last = wanted
+        file.seek(first)
+        response = FileResponse(_Slice(file, last - first + 1), as_attachment=True, filename=filename, status=206)
+        response.block_size = BLOCK_SIZE
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    else:
+        response = FileResponse(file, as_attachment=True, filename=filename)
+        response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = tag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def report_token(sponsor):
+    # signed with SECRET_KEY, so the link itself is the permission to download this one report
+    return signing.dumps({'sponsor': sponsor.pk, 'file': sponsor.report_file.name}, salt=REPORT_SALT, compress=True)
+
+
+def read_report_token(token):
+    """(sponsor id, file name) of a report link, raises signing.BadSignature when it is forged or expired."""
+    data = signing.loads(token, salt=REPORT_SALT, max_age=REPORT_LINK_MAX_AGE)
+    return data['sponsor'], data['file']
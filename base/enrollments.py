@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import counters, rollups
+from .models import Course, Enrollment, User
+from .notifications import notify_many, on_enrolled_many
+
+BATCH_SIZE = 1000
+MAX_ITEMS = getattr(settings, 'BULK_ENROLLMENT_MAX_ITEMS', 5000)
+
+
+def _pair(item):
+    # (student id, course id) of one requested item, None when it is not two ids
+    if not isinstance(item, dict):
+        return None
+    student, course = item.get('student'), item.get('course')
+    if type(student) is not int or type(course) is not int:
+        return None
+    return student, course
+
+
+def _existing(student_ids, course_ids):
+    # a superset of the existing pairs in one query, the exact pairs are picked out by the callers
+    return set(
+        Enrollment.objects.filter(student_id__in=student_ids, course_id__in=course_ids).values_list('student_id', 'course_id')
+    )
+
+
+def _insert(new, results, student_ids, course_ids):
+    # pairs another request enrolled since the check in bulk_enroll make the insert fail on unique_enrollment,
+    # they are reported as already enrolled and the rest is inserted again. Returns the enrollments created
+    while True:
+        try:
+            with transaction.atomic():
+                Enrollment.objects.bulk_create(new, batch_size=BATCH_SIZE)
+            return new
+        except IntegrityError:
+            taken = _existing(student_ids, course_ids) & {(enrollment.student_id, enrollment.course_id) for enrollment in new}
+            if not taken:
+                raise
+            for result in results:
+                if result['status'] == 'enrolled' and (result['student'], result['course']) in taken:
+                    result['status'] = 'already_enrolled'
+            new = [
+                Enrollment(student_id=enrollment.student_id, course_id=enrollment.course_id, instructor_id=enrollment.instructor_id, status='enrolled')
+                for enrollment in new if (enrollment.student_id, enrollment.course_id) not in taken
+            ]
+
+
+def bulk_enroll(user, items):
+    """Enroll many (student, course) pairs in one transaction with a fixed number of queries.
+
+    `user` is the admin or instructor doing it, instructors may only enroll into their own courses. Returns one
+    result per item, in request order, with a status of enrolled, already_enrolled, duplicate, invalid,
+    unknown_student, unknown_course or forbidden.
+    """
+    pairs = [_pair(item) for item in items]
+    wanted = {pair for pair in pairs if pair}
+    student_ids = {student for student, _ in wanted}
+    course_ids = {course for _, course in wanted}
+
+    students = dict(User.objects.filter(id__in=student_ids, role='student').values_list('id', 'username'))
+    courses = {course['id']: course for course in Course.objects.filter(id__in=course_ids).values('id', 'title', 'instructor_id')}
+    existing = _existing(student_ids, course_ids)
+
+    results, new, seen = [], [], set()
+    for pair in pairs:
+        if pair is None:
+            results.append({'status': 'invalid'})
+            continue
+        student, course = pair
+        if pair in seen:
+            state = 'duplicate'
+        elif student not in students:
+            state = 'unknown_student'
+        elif course not in courses:
+            state = 'unknown_course'
+        elif user.role != 'admin' and courses[course]['instructor_id'] != user.id:
+            state = 'forbidden'
+        elif pair in existing:
+            state = 'already_enrolled'
+        else:
+            state = 'enrolled'
+            new.append(Enrollment(student_id=student, course_id=course, instructor_id=courses[course]['instructor_id'], status='enrolled'))
+        seen.add(pair)
+        results.append({'student': student, 'course': course, 'status': state})
+
+    with transaction.atomic():
+        new = _insert(new, results, student_ids, course_ids)
+
+        # bulk_create skips the signals, so the counters and rollups get the same deltas here
+        per_course, per_day = {}, {}
+        for enrollment in new:
+            per_course[enrollment.course_id] = per_course.get(enrollment.course_id, 0) + 1
+            per_day[enrollment.enrolled_at] = per_day.get(enrollment.enrolled_at, 0) + 1
+        counters.add(counters.ENROLLMENTS, len(new))
+        for course, total in per_course.items():
+            counters.add(counters.course_key(course), total)
+        for day, total in per_day.items():
+            rollups.bump(rollups.ENROLLMENTS, day, count=total)
+
+        pairs = [(enrollment.student_id, enrollment.course_id) for enrollment in new]
+        if pairs:
+            notify_many(
+                (student, f"New Enrollment by {students[student]} for course {courses[course]['title']}")
+                for student, course in pairs
+            )
+            on_enrolled_many(pairs)
+    return results
@@ -0,0 +1,109 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Enrollment, StudentProgress, Submission
+
+CHUNK_SIZE = 2000 # rows fetched from the database cursor at a time
+FLUSH_SIZE = 64 * 1024 # bytes collected before a piece of the body is sent
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def enrollments():
+    return Enrollment.objects.values(
+        'id', 'course_id', 'student_id', 'status', 'enrolled_at', 'progress',
+        course_title=F('course__title'), student_name=F('student__username'),
+    )
+
+
+def submissions():
+    return Submission.objects.values(
+        'id', 'assessment_id', 'submitted_at', 'add_file',
+        assessment_title=F('assessment__title'), course_id=F('assessment__course_id'),
+        student_id=F('submitted_by_id'), student_name=F('submitted_by__username'),
+    )
+
+
+def grades():
+    return StudentProgress.objects.values(
+        'id', 'assessment_id', 'student_id', 'is_completed', 'marks_obtained',
+        assessment_title=F('assessment__title'), course_id=F('assessment__course_id'), student_name=F('student__username'),
+    )
+
+
+# dataset: (values() queryset, lookup of the owning instructor, lookup of the course)
+DATASETS = {
+    'enrollments': (enrollments, 'instructor', 'course_id'),
+    'submissions': (submissions, 'assessment__created_by', 'assessment__course_id'),
+    'grades': (grades, 'instructor', 'assessment__course_id'),
+}
+
+
+def export_rows(dataset, user, course=None):
+    """Column names and rows (dicts) of `dataset` visible to `user`.
+
+    The rows are read from the database CHUNK_SIZE at a time while the response is being sent.
+    """
+    queryset, owner, course_lookup = DATASETS[dataset]
+    rows = queryset()
+    if user.role != 'admin':
+        rows = rows.filter(**{owner: user})
+    if course is not None:
+        rows = rows.filter(**{course_lookup: course})
+    columns = [*rows.query.values_select, *rows.query.annotation_select]
+    return columns, rows.order_by('id').iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Line:
+    # csv.writer wants a file, this one just hands back what would have been written
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def buffered(lines, size=FLUSH_SIZE):
+    # one piece per ~64kB instead of one per row keeps the per chunk overhead of the server down
+    pieces, length = [], 0
+    for line in lines:
+        data = line.encode()
+        pieces.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(pieces)
+            pieces, length = [], 0
+    if pieces:
+        yield b''.join(pieces)
+
+
+def gzipped(chunks):
+    # wbits 31 writes a gzip header, the whole body is compressed as it is produced
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset, user, output='csv', compress=False, course=None):
+    lines = (csv_lines if output == 'csv' else ndjson_lines)(*export_rows(dataset, user, course))
+    chunks = buffered(lines)
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,208 @@
+import csv
+import io
+import time
+import zipfile
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Assessment, Enrollment, StudentProgress, User
+from .outbox import queue_mails
+
+BATCH_SIZE = getattr(settings, 'GRADEBOOK_BATCH_SIZE', 1000)
+MAX_ERRORS = 1000 # rows with errors listed in the response, the rest are only counted
+COLUMNS = ('student', 'assessment', 'marks')
+TRUE = {'1', 'true', 'yes', 'y'}
+
+
+class GradebookError(Exception):
+    """The file as a whole cannot be read (wrong type, missing columns)."""
+
+
+def _csv_rows(upload):
+    # the upload is read line by line, django keeps big uploads in a temporary file
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise GradebookError(f"gradebook is not a readable utf-8 csv file ({error})") from error
+    finally:
+        text.detach() # closing the upload is left to django
+
+
+def _xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise GradebookError("xlsx gradebooks need openpyxl installed, upload a csv instead")
+    try:
+        workbook = load_workbook(upload.file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as error: # KeyError: a zip without the workbook parts
+        raise GradebookError(f"gradebook is not a readable xlsx file ({error})") from error
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_gradebook(upload):
+    """(row number, {column: value}) of every data row of a csv or xlsx upload with a header row.
+
+    Needs the student (id or username), assessment (id) and marks columns, is_completed is optional.
+    """
+    name = upload.name.lower()
+    if name.endswith('.csv'):
+        rows = _csv_rows(upload)
+    elif name.endswith('.xlsx'):
+        rows = _xlsx_rows(upload)
+    else:
+        raise GradebookError("gradebook must be a .csv or .xlsx file")
+
+    header = [column.strip().lower() for column in next(rows, [])]
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise GradebookError(f"gradebook is missing the column(s): {', '.join(missing)}")
+    for number, row in enumerate(rows, start=2):
+        if any(value.strip() for value in row):
+            yield number, dict(zip(header, (value.strip() for value in row)))
+
+
+def _parse(row):
+    errors = []
+    student = row.get('student', '')
+    assessment = row.get('assessment', '')
+    if not assessment.isdigit():
+        errors.append("assessment must be an assessment id")
+    try:
+        marks = float(row.get('marks', '')) # spreadsheets like to turn 80 into 80.0
+    except ValueError:
+        marks = None
+    if marks is None or not marks.is_integer():
+        marks = None
+        errors.append("marks must be a whole number")
+    if not student:
+        errors.append("student is required")
+    completed = (row.get('is_completed') or 'true').lower() in TRUE
+    return errors, student, int(assessment) if assessment.isdigit() else None, None if marks is None else int(marks), completed
+
+
+class Import:
+    """One gradebook upload of `instructor`, applied batch by batch.
+
+    Every batch is validated with a fixed number of set based queries and written in its own transaction, so a
+    failure halfway keeps the batches before it. Uploading the same file again is harmless: rows are upserted and
+    grades that did not change are skipped, so their students are not mailed a second time.
+    """
+
+    def __init__(self, instructor):
+        self.instructor = instructor
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+        self.errors = []
+        self.seen = set() # (student, assessment) pairs graded so far, duplicates can be in different batches
+
+    def fail(self, number, errors):
+        self.stats['failed'] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def run(self, rows):
+        started = time.perf_counter()
+        rows = iter(rows)
+        while batch := list(islice(rows, BATCH_SIZE)):
+            self.stats['rows'] += len(batch)
+            self.apply(batch)
+        seconds = time.perf_counter() - started
+        self.stats['seconds'] = round(seconds, 4)
+        self.stats['rows_per_second'] = round(self.stats['rows'] / seconds) if seconds else self.stats['rows']
+        return {**self.stats, 'errors': self.errors}
+
+    def apply(self, batch):
+        parsed = [(number, *_parse(row)) for number, row in batch]
+        names = {student for _, _, student, _, _, _ in parsed if student}
+        ids = {int(name) for name in names if name.isdigit()}
+        assessment_ids = {assessment for _, _, _, assessment, _, _ in parsed if assessment}
+
+        # everything the rows are checked against, one query each
+        by_id, by_username = {}, {}
+        for student in User.objects.filter(Q(id__in=ids) | Q(username__in=names), role='student').values('id', 'username', 'email'):
+            by_id[student['id']] = by_username[student['username']] = student
+        assessments = {
+            assessment['id']: assessment
+            for assessment in Assessment.objects.filter(id__in=assessment_ids, created_by=self.instructor)
+            .values('id', 'title', 'max_score', 'course_id', course_title=F('course__title'))
+        }
+        student_ids = set(by_id)
+        enrolled = set(Enrollment.objects.filter(
+            student_id__in=student_ids, course_id__in={assessment['course_id'] for assessment in assessments.values()},
+        ).values_list('student_id', 'course_id'))
+        existing = {}
+        for progress_id, student_id, assessment_id, *grade in StudentProgress.objects.filter(
+            student_id__in=student_ids, assessment_id__in=assessments,
+        ).values_list('id', 'student_id', 'assessment_id', 'marks_obtained', 'is_completed', 'instructor_id'):
+            existing.setdefault((student_id, assessment_id), []).append((progress_id, tuple(grade)))
+
+        grades = []
+        for number, errors, name, assessment_id, marks, completed in parsed:
+            # a number is an id, unless no student has it and it is somebody's username
+            student = by_id.get(int(name)) if name.isdigit() else None
+            student = student or by_username.get(name)
+            assessment = assessments.get(assessment_id)
+            if name and student is None:
+                errors.append(f"unknown student {name}")
+            if assessment_id and assessment is None:
+                errors.append(f"assessment {assessment_id} does not exist or is not yours")
+            if student and assessment:
+                if (student['id'], assessment['course_id']) not in enrolled:
+                    errors.append("student is not enrolled in the course of the assessment")
+                if (student['id'], assessment_id) in self.seen:
+                    errors.append("the gradebook already has a row for this student and assessment")
+                if marks is not None and not 0 <= marks <= assessment['max_score']:
+                    errors.append(f"marks must be between 0 and {assessment['max_score']}")
+            if errors:
+                self.fail(number, errors)
+                continue
+            self.seen.add((student['id'], assessment_id))
+            grades.append((student, assessment, marks, completed))
+
+        self.write(grades, existing)
+
+    def write(self, grades, existing):
+        created, updated, changed = [], [], []
+        for student, assessment, marks, completed in grades:
+            values = {'marks_obtained': marks, 'is_completed': completed, 'instructor': self.instructor}
+            current = existing.get((student['id'], assessment['id']))
+            if current and all(grade == (marks, completed, self.instructor.id) for _, grade in current):
+                # e.g. the rows of an upload that is sent again after fixing a later row
+                self.stats['unchanged'] += 1
+                continue
+            if current:
+                updated += [StudentProgress(id=progress_id, **values) for progress_id, _ in current]
+            else:
+                created.append(StudentProgress(student_id=student['id'], assessment_id=assessment['id'], **values))
+            changed.append((student, assessment, marks, completed))
+
+        with transaction.atomic():
+            # an upsert, a grade another request created since the check above is updated instead of failing the batch
+            StudentProgress.objects.bulk_create(
+                created, batch_size=BATCH_SIZE,
+                update_conflicts=True, unique_fields=['assessment', 'student'], update_fields=['marks_obtained', 'is_completed', 'instructor'],
+            )
+            StudentProgress.objects.bulk_update(updated, ['marks_obtained', 'is_completed', 'instructor'], batch_size=BATCH_SIZE)
+            # the same report StudentProgressSerialiser queues for a single grade
+            queue_mails((
+                (
+                    f"Assessment Report: {assessment['title']} - {assessment['course_title']}",
+                    f"Hi {student['username']},\n\n"
+                    f"You've completed the assessment: {assessment['title']} - {assessment['course_title']}.\n"
+                    f"Marks Obtained: {marks}\n\n"
+                    f"Great job!",
+                    [student['email']],
+                )
+                for student, assessment, marks, _ in changed
+            ), from_email=settings.EMAIL_HOST_USER)
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed) - len(created)
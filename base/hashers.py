@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Django's PBKDF2 hasher with the work factor taken from PASSWORD_HASH_ITERATIONS.
+
+    The algorithm name stays pbkdf2_sha256 and every hash stores its own iteration count, so hashes made with
+    another count keep verifying and are re-hashed with the configured one at the next login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from base.authentication import token_cache
+from base.benchmark import _percentile
+from base.models import AuthToken, User
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "On a throwaway test database, time login for every PBKDF2 work factor given and authenticated requests "
+        "with and without the token cache (p50/p95)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, nargs='+', default=[1_000_000, 100_000, 10_000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for iterations in options['iterations']:
+                with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                    user = User.objects.create_user(email=f'auth{iterations}@bench.test', username=f'auth{iterations}', password=PASSWORD, role='admin')
+                    client = APIClient()
+                    self.report(f"login, {iterations} iterations", options['repeat'], lambda: client.post('/login/', {'email': user.email, 'password': PASSWORD}))
+
+            token = AuthToken.objects.create(user=user)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            # mail-status/ does one small query of its own, the rest is authentication. invalidate() drops the token
+            # from every tier, clear() leaves the shared cache alone
+            self.report("request, token cache cold", options['repeat'], lambda: (token_cache.invalidate([token.key]), client.get('/mail-status/')))
+            self.report("request, token cache warm", options['repeat'], lambda: client.get('/mail-status/'))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def report(self, label, repeat, call):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f"{label}: p50 {statistics.median(timings):.2f}ms, p95 {_percentile(timings, 95):.2f}ms")
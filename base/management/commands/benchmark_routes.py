@@ -0,0 +1,67 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from base.benchmark import BUDGETS_FILE, SCALE, budgets_from, load_budgets, over_budget, run_routes, seed_dataset, url_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database, call every route in LMS/urls.py as every role that can use it and record "
+        "query counts, p50/p95 latency and response size. Exits with an error when a route is over budget."
+    )
+
+    def add_arguments(self, parser):
+        for key, default in SCALE.items():
+            parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20, help="Calls per route and role")
+        parser.add_argument('--output', help="Write the json report here instead of stdout")
+        parser.add_argument('--budgets', default=str(BUDGETS_FILE))
+        parser.add_argument('--route', action='append', dest='routes', help="Only run this url name, can be repeated")
+        parser.add_argument('--update-budgets', action='store_true', help="Store the budgets of the routes that ran, the others are kept")
+        parser.add_argument('--no-latency', action='store_true', help="Only enforce the query budgets")
+
+    def handle(self, *args, **options):
+        scale = {key: options[key] for key in SCALE}
+        unknown = sorted(set(options['routes'] or []) - set(url_names()))
+        if unknown:
+            raise CommandError(f"no such route: {', '.join(unknown)}")
+
+        # never touch the real database, the run gets its own test database like the test suite does
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                actors = seed_dataset(seed=options['seed'], **scale)
+                results = run_routes(actors, repeat=options['repeat'], names=options['routes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = json.dumps({'scale': scale, 'repeat': options['repeat'], 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+        if options['update_budgets']:
+            # latency budgets of one run are noisy, routes that did not change keep theirs
+            try:
+                stored = load_budgets(options['budgets'])
+            except FileNotFoundError:
+                stored = {}
+            with open(options['budgets'], 'w') as budgets:
+                json.dump(dict(sorted({**stored, **budgets_from(results)}.items())), budgets, indent=2)
+                budgets.write('\n')
+            self.stderr.write(f"budgets written to {options['budgets']}")
+            return
+
+        failures = over_budget(results, load_budgets(options['budgets']), check_latency=not options['no_latency'])
+        if failures:
+            raise CommandError("routes over budget:\n" + "\n".join(failures))
+        self.stderr.write(self.style.SUCCESS(f"all {len(results)} route/role pairs within budget"))
@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from base.benchmark import _percentile
+from base.models import Course, User
+from base.search import Fts5Backend, LikeBackend, supports_fts5
+
+SYLLABLES = ['ba', 'co', 'de', 'fi', 'go', 'ha', 'ji', 'ka', 'lo', 'mu', 'ne', 'po', 'ra', 'si', 'tu', 'vo', 'xe', 'za']
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a throwaway test database with synthetic courses and compare the first page of course search "
+        "results of the old LIKE filter with the FTS5 index (p50/p95 per backend)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=1_000_000)
+        parser.add_argument('--instructors', type=int, default=500)
+        parser.add_argument('--vocabulary', type=int, default=2000, help="Distinct words used in course titles")
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs of every query per backend")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not supports_fts5(connection):
+            raise CommandError("the course search index needs sqlite with fts5")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rng = random.Random(options['seed'])
+            words = self.vocabulary(rng, options['vocabulary'])
+            self.load(rng, words, options)
+
+            started = time.perf_counter()
+            Fts5Backend().rebuild()
+            self.stdout.write(f"indexed {options['courses']} courses in {time.perf_counter() - started:.1f}s")
+
+            queries = self.queries(rng, words, options['queries'])
+            for backend in [LikeBackend(), Fts5Backend()]:
+                self.run(backend, queries, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def vocabulary(self, rng, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+        words = sorted(words)
+        rng.shuffle(words) # the position is the zipf rank, frequent words should not all share a prefix
+        return words
+
+    def weights(self, words):
+        return [1 / rank for rank in range(1, len(words) + 1)]
+
+    def load(self, rng, words, options):
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(email=f'search{number}@bench.test', username=f'search_instructor{number}', password=password, role='instructor')
+            for number in range(options['instructors'])
+        ])
+        instructors = list(User.objects.filter(role='instructor').values_list('id', flat=True))
+        # zipf like word frequencies, a few words are in a large share of the titles like "introduction" would be
+        weights = self.weights(words)
+        start = date(2024, 1, 1)
+
+        started = time.perf_counter()
+        for offset in range(0, options['courses'], options['chunk_size']):
+            with transaction.atomic():
+                Course.objects.bulk_create([
+                    Course(title=' '.join(rng.choices(words, weights, k=rng.randint(2, 6))), difficulty=rng.choice(['easy', 'intermediate', 'hard']),
+                           instructor_id=rng.choice(instructors), start_date=start + timedelta(days=rng.randrange(730)), end_date=start + timedelta(days=800))
+                    for _ in range(min(options['chunk_size'], options['courses'] - offset))
+                ])
+        self.stdout.write(f"loaded {options['courses']} courses in {time.perf_counter() - started:.1f}s")
+
+    def queries(self, rng, words, total):
+        # common and rare words, typed prefixes and two word queries
+        weights = self.weights(words)
+        queries = []
+        for number in range(total):
+            word = rng.choices(words, weights)[0] if number % 2 else rng.choice(words)
+            kind = number % 3
+            if kind == 0:
+                queries.append(word)
+            elif kind == 1:
+                queries.append(word[:3])
+            else:
+                queries.append(f'{word} {rng.choice(words)[:4]}')
+        return queries
+
+    def run(self, backend, queries, options):
+        ordering = ('search_rank', 'id') if isinstance(backend, Fts5Backend) else ('start_date', 'id')
+        timings, found = [], 0
+        for query in queries:
+            for attempt in range(options['repeat']):
+                started = time.perf_counter()
+                page = list(backend.search(Course.objects.all(), query).order_by(*ordering)[:options['page_size'] + 1])
+                timings.append((time.perf_counter() - started) * 1000)
+            found += bool(page)
+        self.stdout.write(
+            f"{type(backend).__name__}: p50 {statistics.median(timings):.2f}ms, p95 {_percentile(timings, 95):.2f}ms, "
+            f"{found}/{len(queries)} queries with results"
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from base.uploads import clean_expired
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads that expired before they were completed, together with their part files."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"removed {clean_expired()} expired uploads")
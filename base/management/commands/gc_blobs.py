@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from base.storage import collect_garbage, recount_refs
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs that no file field references any more, and blob files left behind by failed saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24, help="only remove blobs unreferenced for this long")
+        parser.add_argument('--dry-run', action='store_true', help="report what would be removed without removing it")
+        parser.add_argument('--recount', action='store_true', help="recompute the reference counts from the file fields first")
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f"fixed the reference count of {recount_refs()} blobs")
+        removed, freed = collect_garbage(timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        verb = "would remove" if options['dry_run'] else "removed"
+        self.stdout.write(f"{verb} {removed} blobs, {freed} bytes")
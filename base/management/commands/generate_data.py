@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from base import rollups, search
+from base.counters import reconcile
+from base.synthetic import DEFAULTS, Generator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (users, courses, enrollments, assessments, submissions, "
+        "grades, sponsorships, notifications) with batched bulk inserts. Use a fresh --prefix for every run "
+        "against the same database."
+    )
+
+    def add_arguments(self, parser):
+        for key, default in DEFAULTS.items():
+            kind = date.fromisoformat if isinstance(default, date) else type(default)
+            parser.add_argument(f"--{key.replace('_', '-')}", type=kind, default=default)
+
+    def handle(self, *args, **options):
+        generator = Generator(log=self.stdout.write, **{key: options[key] for key in DEFAULTS})
+        counts = generator.run()
+        # bulk inserts skip the signals that keep the dashboard counters, analytics buckets and search index current
+        reconcile()
+        for metric in rollups.SOURCES:
+            rollups.rebuild(metric)
+        search.get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("generated " + ", ".join(f"{total} {model}" for model, total in counts.items())))
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from base.rollups import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily analytics buckets from the source tables, e.g. after bulk imports or the first deploy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metric', choices=sorted(SOURCES), action='append', help="Defaults to every metric")
+        parser.add_argument('--start', type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        for metric in options['metric'] or sorted(SOURCES):
+            rebuild(metric, options['start'], options['end'])
+            self.stdout.write(f"rebuilt {metric}")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from base.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course search index from the course table, e.g. after bulk imports or the first deploy."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(f"indexed {indexed} courses with {type(backend).__name__}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from base.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters from the tables and correct any drift. Meant to run periodically (cron)."
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+        for key, (stored, real) in sorted(drift.items()):
+            self.stdout.write(f"{key}: {stored} -> {real}")
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} counters corrected"))
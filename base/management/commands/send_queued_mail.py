@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Send the mails waiting in the outbox. Use --loop to keep running as a background worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Messages sent per smtp connection")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to sleep when the outbox is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            result = deliver_pending(batch_size=options['batch_size'])
+            if result['sent'] or result['failed']:
+                self.stdout.write(f"sent {result['sent']}, failed {result['failed']}")
+
+            if not options['loop']:
+                # drain everything that is due and stop
+                if not (result['sent'] or result['failed']):
+                    break
+                continue
+            if not (result['sent'] or result['failed']):
+                time.sleep(options['interval'])
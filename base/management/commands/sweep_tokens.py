@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from base.tokens import SWEEP_BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = "Delete expired api tokens in batches, run it from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"removed {sweep(batch_size=options['batch_size'])} expired tokens")
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_counters(apps, schema_editor):
+    # existing users start with the number of unread notifications they already have
+    User = apps.get_model('base', 'User')
+    Notification = apps.get_model('base', 'Notification')
+    NotificationCounter = apps.get_model('base', 'NotificationCounter')
+    unread = dict(
+        Notification.objects.filter(is_read=False).order_by().values('user_id').annotate(total=models.Count('id')).values_list('user_id', 'total')
+    )
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id, unread=unread.get(user_id, 0)) for user_id in User.objects.values_list('id', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.CharField(max_length=300)),
+                ('link', models.URLField(blank=True)),
+                ('time', models.DateTimeField(auto_now_add=True)),
+                ('role', models.CharField(blank=True, choices=[('admin', 'Admin'), ('instructor', 'Instructor'), ('student', 'Student'), ('sponsor', 'Sponsor')], max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'time'], name='base_notifi_user_id_26b338_idx'),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='base.course'),
+        ),
+        migrations.AddIndex(
+            model_name='broadcast',
+            index=models.Index(fields=['course', 'time'], name='base_broadc_course__370ffd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='broadcast',
+            index=models.Index(fields=['role', 'time'], name='base_broadc_role_91b398_idx'),
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('enrollments', 'Enrollments'), ('submissions', 'Submissions'), ('sponsorships', 'Sponsorships')], max_length=30)),
+                ('key', models.BigIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'key', 'day'), name='unique_rollup_bucket')],
+            },
+        ),
+    ]
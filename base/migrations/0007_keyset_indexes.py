@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['start_date', 'id'], name='base_course_start_d_30132b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', 'start_date', 'id'], name='base_course_instruc_566323_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sponsor',
+            index=models.Index(fields=['sponsor', 'sponsorship_date', 'id'], name='base_sponso_sponsor_8673b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['instructor', 'id'], name='base_studen_instruc_2d7e7b_idx'),
+        ),
+    ]
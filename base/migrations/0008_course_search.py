@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:28
+
+import base.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_index(apps, schema_editor):
+    # fts5 index behind base/search.py, databases without it keep the LIKE based search
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if not any(option == 'ENABLE_FTS5' for option, in cursor.fetchall()):
+            return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE base_course_search USING fts5(title, difficulty, instructor, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    # the ranking is stored in the index so `rank` can be selected and compared like a column, title hits count most
+    schema_editor.execute("INSERT INTO base_course_search(base_course_search, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')")
+    schema_editor.execute(
+        "INSERT INTO base_course_search(rowid, title, difficulty, instructor) "
+        "SELECT course.id, course.title, course.difficulty, instructor.username "
+        "FROM base_course course JOIN base_user instructor ON instructor.id = course.instructor_id"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute("DROP TABLE IF EXISTS base_course_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearch',
+            fields=[
+                ('course', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='base.course')),
+                ('document', base.models.SearchDocumentField(db_column='base_course_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'base_course_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
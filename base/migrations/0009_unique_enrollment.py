@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    # the single enrollment view only had an exists() check, so racing requests could enroll twice;
+    # the oldest enrollment of every (student, course) pair is kept. The dashboard counters and enrollment
+    # rollups still count the removed rows, run reconcile_counters and rebuild_rollups afterwards
+    Enrollment = apps.get_model('base', 'Enrollment')
+    keep = (
+        Enrollment.objects.order_by().values('student_id', 'course_id')
+        .annotate(first=models.Min('id'), total=models.Count('id')).filter(total__gt=1)
+    )
+    for pair in list(keep):
+        Enrollment.objects.filter(student_id=pair['student_id'], course_id=pair['course_id']).exclude(id=pair['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_course_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_enrollment'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:59
+
+import base.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_tokens(apps, schema_editor):
+    # tokens handed out before keep working, they expire one AUTH_TOKEN_TTL after this migration
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('base', 'AuthToken')
+    AuthToken.objects.bulk_create(
+        [AuthToken(key=token.key, user_id=token.user_id, created_at=token.created) for token in Token.objects.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_blob'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True, default=base.models.token_expiry)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at'], name='base_authto_user_id_cda3d4_idx')],
+            },
+        ),
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
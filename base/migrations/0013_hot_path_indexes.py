@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_grades(apps, schema_editor):
+    # the progress view only had an exists() check, so racing requests could grade twice; the newest grade of
+    # every (assessment, student) pair is kept. Unlike 0009 nothing needs reconciling afterwards, the counters
+    # and rollups do not count grades and the dashboards compute progress from this table
+    StudentProgress = apps.get_model('base', 'StudentProgress')
+    keep = (
+        StudentProgress.objects.order_by().values('assessment_id', 'student_id')
+        .annotate(last=models.Max('id'), total=models.Count('id')).filter(total__gt=1)
+    )
+    for pair in list(keep):
+        StudentProgress.objects.filter(assessment_id=pair['assessment_id'], student_id=pair['student_id']).exclude(id=pair['last']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('base', '0012_authtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studentprogress',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='progress', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='course_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['student', 'is_completed'], name='progress_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['assessment', 'submitted_at', 'id'], name='submission_assessment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'id'], name='user_role_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_grades, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studentprogress',
+            constraint=models.UniqueConstraint(fields=('assessment', 'student'), name='unique_progress'),
+        ),
+    ]
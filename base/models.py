@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+from datetime import timedelta
+import secrets
+import uuid
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -17,6 +22,11 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'  # blackbox ai suggestion , finds out this helps us create email as primary login field 
     REQUIRED_FIELDS = ['username'] #username still needed but it is not primary login field
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['role', 'id'], name='user_role_idx'), # role filters, counts and broadcasts
+        ]
+
     def __str__(self):
         return f"{self.username}({self.role})" # being neat
 
@@ -34,6 +44,14 @@ class Course(models.Model):
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'id']), # keyset pagination of the course list
+            models.Index(fields=['instructor', 'start_date', 'id']), # instructors only page through their own courses
+            # only the active courses are counted, the index stays as small as that set
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='course_active_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -49,6 +67,12 @@ class Enrollment(models.Model):
     enrolled_at = models.DateField(auto_now_add=True)
     progress = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            # bulk enrollment relies on it to notice pairs another request enrolled meanwhile
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_enrollment'),
+        ]
+
     def __str__(self):
         return f"{self.student}'s enrollment for {self.course}"
     
@@ -77,7 +101,12 @@ class Submission(models.Model):
     add_file = models.FileField()
     submitted_by = models.ForeignKey(User,on_delete=models.CASCADE)
     submitted_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['assessment', 'submitted_at', 'id'], name='submission_assessment_idx'), # archive manifest order
+        ]
+
     def __str__(self):
         return f"{self.assessment}'s submission"
 
@@ -91,18 +120,33 @@ class Sponsor(models.Model):
     #progress report related fields
     report_file = models.FileField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sponsor', 'sponsorship_date', 'id']), # keyset pagination of a sponsor's list
+        ]
+
     def __str__(self):
         return f"{self.student} sponsored by {self.sponsor}"
     
 
 
 class StudentProgress(models.Model):
-    student = models.ForeignKey(User,on_delete=models.CASCADE,related_name='progress')
+    student = models.ForeignKey(User,on_delete=models.CASCADE,related_name='progress',db_index=False) # progress_completed_idx starts with it
     assessment = models.ForeignKey(Assessment,on_delete=models.CASCADE)
     is_completed = models.BooleanField(default=False)
     marks_obtained = models.IntegerField(default=0)
     instructor = models.ForeignKey(User,on_delete=models.CASCADE,related_name='instructor_name')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['instructor', 'id']), # keyset pagination of an instructor's gradebook
+            models.Index(fields=['student', 'is_completed'], name='progress_completed_idx'), # sponsor dashboard counts
+        ]
+        constraints = [
+            # one grade per student and assessment, the gradebook upload upserts on it
+            models.UniqueConstraint(fields=['assessment', 'student'], name='unique_progress'),
+        ]
+
     def __str__(self):
         return f"{self.student}'s {self.assessment} progress"
     
@@ -114,5 +158,199 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     link = models.URLField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'time']), # notification feed is read per user, newest first
+            models.Index(fields=['user', 'is_read', 'time']), # unread feed and mark read
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.message[:50]}" #slicing first 50 letters for clean look jammai aayo vane wild dekhinxa
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed')
+    ]
+    subject = models.CharField(max_length=300)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    attachment = models.CharField(max_length=500, blank=True) # storage name, the worker reads the file only when sending
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']), # the worker polls on this
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+
+class Broadcast(models.Model):
+    # events meant for a whole audience are stored once instead of one Notification row per user
+    message = models.CharField(max_length=300)
+    link = models.URLField(blank=True)
+    time = models.DateTimeField(auto_now_add=True)
+    role = models.CharField(max_length=100, choices=User.ROLE_CHOICES, blank=True) # blank means every role
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='broadcasts') # set means only students of this course
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'time']),
+            models.Index(fields=['role', 'time']),
+        ]
+
+    def __str__(self):
+        return self.message[:50]
+
+
+class NotificationCounter(models.Model):
+    # denormalized so the unread badge is a primary key lookup instead of a count over the feed
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+    read_until = models.DateTimeField(null=True, blank=True) # broadcasts up to this time count as read
+
+    def __str__(self):
+        return f"{self.user}: {self.unread} unread"
+
+
+class Counter(models.Model):
+    # running totals kept up to date by signals (see base/counters.py) so dashboards never count whole tables
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class DailyRollup(models.Model):
+    # pre-aggregated daily buckets for the analytics endpoints, maintained incrementally by base/rollups.py
+    METRIC_CHOICES = [
+        ('enrollments', 'Enrollments'),
+        ('submissions', 'Submissions'),
+        ('sponsorships', 'Sponsorships')
+    ]
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES)
+    key = models.BigIntegerField(default=0) # assessment id for submissions, 0 for metrics without a breakdown
+    day = models.DateField()
+    count = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0) # summed amount for sponsorships
+
+    class Meta:
+        constraints = [
+            # also the index every range query of the analytics endpoints runs on
+            models.UniqueConstraint(fields=['metric', 'key', 'day'], name='unique_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.key}] {self.day}: {self.count}"
+
+
+class SearchDocumentField(models.TextField):
+    # the hidden column of an fts5 table that is named like the table itself, only queried with `match`
+    pass
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class CourseSearch(models.Model):
+    # a row of the sqlite fts5 course index (base/search.py), the table is created by migration 0008 and
+    # written with raw sql, the model only exists so course querysets can join it on rowid
+    course = models.OneToOneField(Course, primary_key=True, db_column='rowid', db_constraint=False,
+                                  on_delete=models.DO_NOTHING, related_name='search_entry')
+    document = SearchDocumentField(db_column='base_course_search')
+    rank = models.FloatField() # bm25 with the column weights stored in the index, lower is better
+
+    class Meta:
+        managed = False
+        db_table = 'base_course_search'
+
+
+class UploadSession(models.Model):
+    # a resumable chunked upload (base/uploads.py), chunks are appended to a part file until `offset` reaches `size`
+    TARGET_CHOICES = [
+        ('submission', 'Submission'),
+        ('assessment', 'Assessment')
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) # unguessable, it is in the upload url
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE) # submitted to, or whose file is replaced
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0) # bytes received and verified so far
+    digests = models.JSONField(default=list) # sha256 of every received chunk, in order
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    submission = models.ForeignKey(Submission, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['completed_at', 'expires_at']), # cleanup of abandoned uploads
+        ]
+
+    def __str__(self):
+        return f"{self.user} uploading {self.filename} ({self.offset}/{self.size})"
+
+
+class Blob(models.Model):
+    # one stored file content of the content addressed storage (base/storage.py), shared by every row that uses it
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    refs = models.IntegerField(default=0) # file fields pointing at it, kept by signals
+    touched_at = models.DateTimeField(default=timezone.now) # last time it was written, gc leaves fresh blobs alone
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refs', 'touched_at']), # garbage collection
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refs} refs)"
+
+
+def token_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 7 * 24 * 3600))
+
+
+class AuthToken(models.Model):
+    # api token with an expiry, a user can have several (one per device, rotated ones still in their grace period)
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(default=token_expiry, db_index=True) # the sweeper deletes by this
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']), # newest token of a user at login
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = secrets.token_hex(20)
+        super().save(*args, **kwargs)
+
+    @property
+    def expired(self):
+        return self.expires_at <= timezone.now()
+
     def __str__(self):
-        return f"{self.user}: {self.message[:50]}" #slicing first 50 letters for clean look jammai aayo vane wild dekhinxa
\ No newline at end of file
+        return f"token of {self.user_id} until {self.expires_at}"
@@ -0,0 +1,232 @@
+import base64
+import logging
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import BooleanField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Broadcast, Enrollment, Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, 'NOTIFICATION_CHUNK_SIZE', 1000)
+MESSAGE_LENGTH = Notification._meta.get_field('message').max_length
+CURSOR_SALT = 'notification-cursor'
+
+
+# personal notifications sort before broadcasts with the same timestamp in the feed
+KIND_RANK = {'notification': 1, 'broadcast': 0}
+
+
+def _bump_unread(counters, delta=1):
+    # counters are only ever changed with F() updates so concurrent writers cannot lose increments
+    return counters.update(unread=F('unread') + delta)
+
+
+def notify(user, message, link=''):
+    # single notification, used for things that only concern one user (enrollment, submission)
+    notification = Notification.objects.create(user=user, message=message[:MESSAGE_LENGTH], link=link)
+    _bump_unread(NotificationCounter.objects.filter(user=user))
+    return notification
+
+
+def _bump_each(deltas):
+    # {user_id: delta} with one UPDATE per distinct delta instead of one per user
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        _bump_unread(NotificationCounter.objects.filter(user_id__in=user_ids), delta)
+
+
+def notify_many(notifications):
+    """Bulk version of notify() for (user_id, message) pairs that each get their own text."""
+    rows = [Notification(user_id=user_id, message=message[:MESSAGE_LENGTH]) for user_id, message in notifications]
+    Notification.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    deltas = {}
+    for row in rows:
+        deltas[row.user_id] = deltas.get(row.user_id, 0) + 1
+    _bump_each(deltas)
+    return len(rows)
+
+
+def _audience_counters(broadcast):
+    counters = NotificationCounter.objects.all()
+    if broadcast.course_id:
+        return counters.filter(user__in=Enrollment.objects.filter(course_id=broadcast.course_id).values('student_id'))
+    if broadcast.role:
+        return counters.filter(user__role=broadcast.role)
+    return counters
+
+
+def broadcast(message, link='', role='', course=None):
+    """Store an event once for a whole audience (a role, or the students of `course`).
+
+    This replaces writing one Notification row per student: only the unread counters of the audience are
+    touched, with a single UPDATE. The size of the audience and the time it took are logged.
+    """
+    started = time.perf_counter()
+    event = Broadcast.objects.create(message=message[:MESSAGE_LENGTH], link=link, role=role, course=course)
+    reached = _bump_unread(_audience_counters(event))
+    seconds = time.perf_counter() - started
+    logger.info(
+        "broadcast %s reached %s users in %ss (%s/s)",
+        event.pk, reached, round(seconds, 4), round(reached / seconds) if seconds else reached,
+    )
+    return event
+
+
+def _read_until(user):
+    return NotificationCounter.objects.filter(user=user).values_list('read_until', flat=True).first()
+
+
+def unread_broadcasts(user, read_until=None):
+    unread = visible_broadcasts(user)
+    if read_until:
+        unread = unread.filter(time__gt=read_until)
+    return unread
+
+
+def on_enrolled(student, course):
+    # a new student of a course also gets to see the broadcasts the course already had
+    missed = unread_broadcasts(student, _read_until(student)).filter(course=course).count()
+    if missed:
+        _bump_unread(NotificationCounter.objects.filter(user=student), missed)
+
+
+def on_enrolled_many(pairs):
+    """Bulk version of on_enrolled() for (student_id, course_id) pairs, a constant number of queries."""
+    courses = {course_id for _, course_id in pairs}
+    events = list(Broadcast.objects.filter(course_id__in=courses).values_list('id', 'course_id', 'time'))
+    if not events:
+        return
+    students = {student_id for student_id, _ in pairs}
+    read_until = dict(NotificationCounter.objects.filter(user_id__in=students).values_list('user_id', 'read_until'))
+
+    by_course = {}
+    for event, course_id, time in events:
+        by_course.setdefault(course_id, []).append((event, time))
+    missed = {}
+    for student_id, course_id in pairs:
+        until = read_until.get(student_id)
+        for event, time in by_course.get(course_id, []):
+            if until is None or time > until:
+                missed[student_id] = missed.get(student_id, 0) + 1
+    _bump_each(missed)
+
+
+def visible_broadcasts(user):
+    return Broadcast.objects.filter(
+        Q(course__isnull=True, role__in=['', user.role], time__gte=user.date_joined)
+        | Q(course__in=Enrollment.objects.filter(student=user).values('course_id'))
+    )
+
+
+def recount_unread(user):
+    """Recompute the unread counter of `user` from the notifications themselves and store it."""
+    unread = (
+        Notification.objects.filter(user=user, is_read=False).count()
+        + unread_broadcasts(user, _read_until(user)).count()
+    )
+    NotificationCounter.objects.update_or_create(user=user, defaults={'unread': unread})
+    return unread
+
+
+def unread_count(user):
+    counter = NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first()
+    if counter is None:
+        # users created before the counters existed get theirs on first use
+        return recount_unread(user)
+    return counter
+
+
+def mark_read(user, until=None):
+    """Mark every notification and broadcast of `user` up to the time `until` (default now) as read.
+
+    Personal notifications are flipped with a single UPDATE over the (user, is_read, time) index; broadcasts
+    only move the read_until watermark of the user. Returns the number of items that became read.
+    """
+    # never past now, broadcasts sent later would be hidden while their counter bump stays
+    until = min(until, timezone.now()) if until else timezone.now()
+    read_until = _read_until(user)
+    if read_until and read_until >= until:
+        broadcasts = 0
+    else:
+        broadcasts = unread_broadcasts(user, read_until).filter(time__lte=until).count()
+    personal = Notification.objects.filter(user=user, is_read=False, time__lte=until).update(is_read=True)
+
+    marked = personal + broadcasts
+    counters = NotificationCounter.objects.filter(user=user)
+    if broadcasts:
+        counters.update(unread=Greatest(F('unread') - marked, 0), read_until=until)
+    elif personal:
+        counters.update(unread=Greatest(F('unread') - marked, 0))
+    return marked
+
+
+def encode_cursor(item):
+    # signed, mark_read trusts the time in it
+    raw = f"{item['time'].isoformat()}|{item['kind']}|{item['id']}"
+    return base64.urlsafe_b64encode(signing.Signer(salt=CURSOR_SALT).sign(raw).encode()).decode()
+
+
+def decode_cursor(cursor):
+    # raises ValueError for anything that was not produced by encode_cursor
+    try:
+        raw = signing.Signer(salt=CURSOR_SALT).unsign(base64.urlsafe_b64decode(cursor.encode()).decode())
+        stamp, kind, pk = raw.split('|')
+        stamp = parse_datetime(stamp)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error, signing.BadSignature) as error:
+        raise ValueError("Invalid cursor") from error
+    if stamp is None or timezone.is_naive(stamp) or kind not in KIND_RANK or not pk.isdigit():
+        raise ValueError("Invalid cursor")
+    return stamp, kind, int(pk)
+
+
+def _older_than(queryset, cursor, kind):
+    # keyset condition for rows that sort after `cursor` in (time, kind, id) descending order
+    if cursor is None:
+        return queryset
+    stamp, cursor_kind, pk = cursor
+    if KIND_RANK[kind] < KIND_RANK[cursor_kind]:
+        return queryset.filter(time__lte=stamp)
+    if KIND_RANK[kind] > KIND_RANK[cursor_kind]:
+        return queryset.filter(time__lt=stamp)
+    return queryset.filter(Q(time__lt=stamp) | Q(time=stamp, pk__lt=pk))
+
+
+def feed(user, cursor=None, limit=20, unread_only=False):
+    """Newest first page of personal notifications and broadcasts for `user`.
+
+    `cursor` is the (time, kind, id) of the last item of the previous page. Each source is read with a
+    keyset condition on its (user, is_read, time) / (course, time) index so deep pages cost the same as the first one.
+    Returns the items and the cursor for the next page (None on the last page).
+    """
+    fields = ('id', 'message', 'link', 'time', 'is_read')
+    read_until = _read_until(user)
+
+    personal = Notification.objects.filter(user=user)
+    if unread_only:
+        personal = personal.filter(is_read=False)
+        shared = unread_broadcasts(user, read_until).annotate(is_read=Value(False))
+    else:
+        # broadcasts are read up to the read_until watermark of the user
+        is_read = ExpressionWrapper(Q(time__lte=read_until), output_field=BooleanField()) if read_until else Value(False)
+        shared = visible_broadcasts(user).annotate(is_read=is_read)
+    personal = _older_than(personal, cursor, 'notification')
+    shared = _older_than(shared, cursor, 'broadcast')
+
+    items = [dict(row, kind='notification') for row in personal.order_by('-time', '-id').values(*fields)[:limit + 1]]
+    items += [dict(row, kind='broadcast') for row in shared.order_by('-time', '-id').values(*fields)[:limit + 1]]
+    items.sort(key=lambda item: (item['time'], KIND_RANK[item['kind']], item['id']), reverse=True)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = (last['time'], last['kind'], last['id'])
+    return items, next_cursor
@@ -0,0 +1,137 @@
+import logging
+import mimetypes
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# all of these can be overridden in settings.py
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 60) # seconds, doubled after every failed attempt
+MAX_RECIPIENTS = getattr(settings, 'OUTBOX_MAX_RECIPIENTS', 100) # smtp servers reject messages with too many recipients
+LEASE = getattr(settings, 'OUTBOX_LEASE', 600) # seconds a claimed batch is left to its worker before others may retry it
+
+
+def queue_mail(subject, message, recipient_list, from_email=None, attachment=''):
+    """Store a mail in the outbox instead of talking to smtp inside the request.
+
+    Big recipient lists are split into several messages. Returns the queued rows.
+    """
+    recipient_list = list(recipient_list)
+    rows = [
+        OutboundEmail(
+            subject=subject,
+            body=message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients=recipient_list[i:i + MAX_RECIPIENTS],
+            attachment=attachment,
+        )
+        for i in range(0, len(recipient_list), MAX_RECIPIENTS)
+    ]
+    return OutboundEmail.objects.bulk_create(rows)
+
+
+def queue_mails(mails, from_email=None):
+    """queue_mail() for many different (subject, message, recipient_list) mails with one insert."""
+    rows = [
+        OutboundEmail(subject=subject, body=message, from_email=from_email or settings.DEFAULT_FROM_EMAIL, recipients=list(recipients))
+        for subject, message, recipients in mails
+    ]
+    return OutboundEmail.objects.bulk_create(rows, batch_size=500)
+
+
+def _build_message(outbound, connection):
+    email = EmailMessage(outbound.subject, outbound.body, outbound.from_email, outbound.recipients, connection=connection)
+    if outbound.attachment:
+        with default_storage.open(outbound.attachment) as attached:
+            content_type, _ = mimetypes.guess_type(outbound.attachment)
+            email.attach(os.path.basename(outbound.attachment), attached.read(), content_type)
+    return email
+
+
+def _retry_later(outbound, error):
+    outbound.attempts += 1
+    outbound.last_error = str(error)
+    if outbound.attempts >= MAX_ATTEMPTS:
+        outbound.status = 'failed'
+    else:
+        outbound.next_attempt_at = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (outbound.attempts - 1))
+    outbound.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _claim(batch_size):
+    # a short transaction that pushes the batch out of the due window, the mails are then sent without holding
+    # any lock. skip_locked lets several workers claim side by side, a worker that dies leaves its mails to
+    # the next one once the lease is over
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[outbound.pk for outbound in batch]).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=LEASE),
+        )
+    return batch
+
+
+def _mark_sent(outbound):
+    OutboundEmail.objects.filter(pk=outbound.pk).update(status='sent', attempts=F('attempts') + 1, sent_at=timezone.now(), last_error='')
+
+
+def deliver_pending(batch_size=None):
+    """Send one batch of due mails over a single smtp connection.
+
+    Failed mails are retried with exponential backoff until MAX_ATTEMPTS, then marked as failed. Every mail's
+    result is saved as soon as it is known, so a crash halfway does not send the earlier ones again.
+    Returns a dict with the number of sent and failed messages.
+    """
+    result = {'sent': 0, 'failed': 0}
+    batch = _claim(batch_size or BATCH_SIZE)
+    if not batch:
+        return result
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        # server is unreachable, nothing in this batch can go out
+        logger.warning("Could not open mail connection: %s", error)
+        for outbound in batch:
+            _retry_later(outbound, error)
+        result['failed'] = len(batch)
+        return result
+
+    try:
+        for outbound in batch:
+            try:
+                _build_message(outbound, connection).send()
+            except Exception as error:
+                logger.warning("Sending mail %s failed: %s", outbound.pk, error)
+                _retry_later(outbound, error)
+                result['failed'] += 1
+                continue
+            _mark_sent(outbound)
+            result['sent'] += 1
+    finally:
+        connection.close()
+    return result
+
+
+def outbox_status():
+    # counts per status plus the age of the oldest mail still waiting, for monitoring the worker
+    counts = {choice: 0 for choice, _ in OutboundEmail.STATUS_CHOICES}
+    for row in OutboundEmail.objects.order_by().values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    oldest = OutboundEmail.objects.filter(status='pending').order_by('created_at').values_list('created_at', flat=True).first()
+    return {'counts': counts, 'oldest_pending': oldest}
@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a stable composite ordering such as (start_date, id).
+
+    The view lists its ordering in `keyset_ordering`; the last field has to be unique (the primary key) and all
+    fields share one direction. Pages are fetched with a WHERE on the ordering columns instead of an OFFSET and
+    no COUNT(*) is run, so every page costs the same however deep the client is.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 100)
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [self.to_python(model, field, value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            return value # an annotation such as a search rank, json already kept its type
+
+    def after(self, values):
+        # (a, b, id) > (x, y, z)  ==  a > x  or  (a = x and b > y)  or  (a = x and b = y and id > z)
+        lookup = 'lt' if self.descending else 'gt'
+        conditions = []
+        for position, field in enumerate(self.fields):
+            equal = {name: value for name, value in zip(self.fields[:position], values)}
+            conditions.append(Q(**equal, **{f'{field}__{lookup}': values[position]}))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', ('id',))
+        self.descending = ordering[0].startswith('-')
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.page_size = self.get_page_size(request)
+        self.request = request
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor, queryset.model)))
+
+        # one extra row tells us whether there is a next page without counting
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, field) for field in self.fields]
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(values))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,192 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.1, # share of requests that are measured
+    'BUCKETS': [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000], # upper bounds of the wall time histogram, ms
+    'DUPLICATE_THRESHOLD': 5, # the same statement this often in one request is logged as a likely n+1
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+class ViewStats:
+    def __init__(self, buckets):
+        self.buckets = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.requests = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.duplicate_queries = 0
+        self.bytes = 0
+
+
+class Registry:
+    """Per view totals and wall time histograms of the sampled requests, kept per process."""
+
+    def __init__(self, buckets):
+        self.bucket_bounds = list(buckets)
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def record(self, view, wall_ms, queries, sql_ms, duplicate_queries, size):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats(self.bucket_bounds)
+            stats.buckets[bisect.bisect_left(self.bucket_bounds, wall_ms)] += 1
+            stats.requests += 1
+            stats.wall_ms += wall_ms
+            stats.max_wall_ms = max(stats.max_wall_ms, wall_ms)
+            stats.queries += queries
+            stats.sql_ms += sql_ms
+            stats.duplicate_queries += duplicate_queries
+            stats.bytes += size
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {view: vars(stats).copy() | {'buckets': list(stats.buckets)} for view, stats in self.views.items()}
+
+    def summary(self):
+        """{view: averages and the histogram} for the admin endpoint, slowest views first."""
+        views = {}
+        for view, stats in self.snapshot().items():
+            requests = stats['requests']
+            views[view] = {
+                'requests': requests,
+                'avg_ms': round(stats['wall_ms'] / requests, 3),
+                'max_ms': round(stats['max_wall_ms'], 3),
+                'avg_queries': round(stats['queries'] / requests, 2),
+                'avg_sql_ms': round(stats['sql_ms'] / requests, 3),
+                'duplicate_queries': stats['duplicate_queries'],
+                'avg_bytes': round(stats['bytes'] / requests),
+                'histogram_ms': dict(zip([*map(str, self.bucket_bounds), '+Inf'], stats['buckets'])),
+            }
+        return dict(sorted(views.items(), key=lambda item: -item[1]['avg_ms']))
+
+    def prometheus(self):
+        """The totals in the prometheus text exposition format (version 0.0.4)."""
+        snapshot = sorted(self.snapshot().items())
+        lines = [
+            '# HELP lms_request_duration_seconds Wall time of sampled requests.',
+            '# TYPE lms_request_duration_seconds histogram',
+        ]
+        for view, stats in snapshot:
+            cumulative = 0
+            for bound, count in zip([*(bound / 1000 for bound in self.bucket_bounds), '+Inf'], stats['buckets']):
+                cumulative += count
+                lines.append(f'lms_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'lms_request_duration_seconds_sum{{view="{view}"}} {stats["wall_ms"] / 1000:.6f}')
+            lines.append(f'lms_request_duration_seconds_count{{view="{view}"}} {stats["requests"]}')
+        for name, value, help_text in [
+            ('lms_request_queries_total', lambda stats: stats['queries'], 'SQL statements run by sampled requests.'),
+            ('lms_request_sql_seconds_total', lambda stats: f"{stats['sql_ms'] / 1000:.6f}", 'Time spent in SQL by sampled requests.'),
+            ('lms_request_duplicate_queries_total', lambda stats: stats['duplicate_queries'], 'Repeated identical SQL statements, n+1 candidates.'),
+            ('lms_response_bytes_total', lambda stats: stats['bytes'], 'Response body bytes of sampled requests.'),
+        ]:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{view="{view}"}} {value(stats)}' for view, stats in snapshot]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(config()['BUCKETS'])
+
+
+class QueryRecorder:
+    # execute wrapper that counts and times every statement, with the statement text to spot duplicates
+    def __init__(self):
+        self.statements = Counter()
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.statements[sql] += 1
+
+    def recording(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+class ProfilingMiddleware:
+    """Measures a sample of the requests: wall time, statements, time in SQL, repeated statements and body size.
+
+    Switched on with PROFILING['ENABLED'], without it django drops the middleware at startup. Streamed bodies
+    are measured until the last piece is sent, including the queries run while streaming.
+    """
+
+    def __init__(self, get_response):
+        options = config()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        self.threshold = options['DUPLICATE_THRESHOLD']
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.recording():
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+
+        if response.streaming and not response.has_header('Content-Length'):
+            response.streaming_content = self.measure_stream(response.streaming_content, view, recorder, started)
+        elif response.streaming:
+            self.finish(view, recorder, started, int(response['Content-Length']))
+        else:
+            self.finish(view, recorder, started, len(response.content))
+        return response
+
+    def measure_stream(self, chunks, view, recorder, started):
+        size = 0
+        try:
+            with recorder.recording():
+                for chunk in chunks:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.finish(view, recorder, started, size)
+
+    def finish(self, view, recorder, started, size):
+        wall_ms = (time.perf_counter() - started) * 1000
+        for sql, count in recorder.statements.items():
+            if count >= self.threshold:
+                logger.warning("%s ran the same statement %d times, likely n+1: %s", view, count, sql[:300])
+        registry.record(view, wall_ms, recorder.count, recorder.seconds * 1000, recorder.duplicates, size)
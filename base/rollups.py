@@ -0,0 +1,83 @@
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import DailyRollup, Enrollment, Sponsor, Submission
+
+ENROLLMENTS = 'enrollments'
+SUBMISSIONS = 'submissions'
+SPONSORSHIPS = 'sponsorships'
+
+CHUNK_SIZE = 2000
+
+
+def bump(metric, day, key=0, count=1, total=0):
+    """Add to one daily bucket inside the current transaction, creating the bucket on its first event."""
+    buckets = DailyRollup.objects.filter(metric=metric, key=key, day=day)
+    if buckets.update(count=F('count') + count, total=F('total') + total):
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(metric=metric, key=key, day=day, count=count, total=total)
+    except IntegrityError:
+        # another request created the bucket in the meantime
+        buckets.update(count=F('count') + count, total=F('total') + total)
+
+
+def submission_day(submission):
+    return timezone.localdate(submission.submitted_at)
+
+
+# how each metric is rebuilt from its source table: queryset, day expression, key expression, summed field
+SOURCES = {
+    ENROLLMENTS: lambda: (Enrollment.objects.all(), F('enrolled_at'), Value(0), None),
+    SUBMISSIONS: lambda: (Submission.objects.all(), TruncDate('submitted_at'), F('assessment_id'), None),
+    SPONSORSHIPS: lambda: (Sponsor.objects.all(), F('sponsorship_date'), Value(0), 'amount'),
+}
+
+
+def rebuild(metric, start=None, end=None):
+    """Recompute the buckets of `metric` between `start` and `end` (inclusive, both optional) from the source table.
+
+    Used to backfill after bulk inserts, which skip the signals that keep the buckets current.
+    """
+    queryset, day, key, summed = SOURCES[metric]()
+    queryset = queryset.annotate(bucket_day=day, bucket_key=key)
+    buckets = DailyRollup.objects.filter(metric=metric)
+    if start:
+        queryset, buckets = queryset.filter(bucket_day__gte=start), buckets.filter(day__gte=start)
+    if end:
+        queryset, buckets = queryset.filter(bucket_day__lte=end), buckets.filter(day__lte=end)
+
+    rows = (
+        queryset.order_by().values('bucket_day', 'bucket_key')
+        .annotate(events=Count('id'), amount=Sum(summed) if summed else Value(0))
+    )
+    fresh = (
+        DailyRollup(metric=metric, key=row['bucket_key'], day=row['bucket_day'], count=row['events'], total=row['amount'] or 0)
+        for row in rows.iterator(chunk_size=CHUNK_SIZE)
+    )
+    with transaction.atomic():
+        buckets.delete()
+        # bulk_create would turn the whole generator into a list, so it gets fed one chunk at a time
+        while chunk := list(islice(fresh, CHUNK_SIZE)):
+            DailyRollup.objects.bulk_create(chunk)
+
+
+def daily(metric, start, end, key=None):
+    buckets = DailyRollup.objects.filter(metric=metric, day__range=(start, end))
+    if key is not None:
+        buckets = buckets.filter(key=key)
+    return buckets.order_by('day', 'key').values('key', 'day', 'count', 'total')
+
+
+def monthly(metric, start, end):
+    # months are summed from the daily buckets, never from the source table
+    return (
+        DailyRollup.objects.filter(metric=metric, day__range=(start, end))
+        .annotate(month=TruncMonth('day')).order_by('month').values('month')
+        .annotate(count=Sum('count'), total=Sum('total'))
+    )
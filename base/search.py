@@ -0,0 +1,117 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Course, CourseSearch, User
+
+TABLE = CourseSearch._meta.db_table
+# indexed columns in the order of migration 0008, which also stores their bm25 weights
+COLUMNS = ['title', 'difficulty', 'instructor']
+
+
+def supports_fts5(connection):
+    # migration 0008 has its own copy of this check, it creates the index only where fts5 is compiled in
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class LikeBackend:
+    """What SearchFilter used to do: icontains over every field, every term has to match somewhere."""
+
+    fields = ['title', 'difficulty', 'instructor__username']
+
+    def search(self, queryset, query):
+        for term in terms(query):
+            queryset = queryset.filter(Q(*[(f'{field}__icontains', term) for field in self.fields], _connector=Q.OR))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index(self, course_ids):
+        pass
+
+    def remove(self, course_ids):
+        pass
+
+    def rebuild(self):
+        return Course.objects.count()
+
+
+class Fts5Backend:
+    """SQLite FTS5 inverted index over title, difficulty and instructor username.
+
+    Every query term is matched as a prefix ("pyth" finds "python") and all terms have to match. Results are
+    annotated with `search_rank` (bm25, lower is better) through a join on the index rowid, which is the course id.
+    """
+
+    def match(self, query):
+        # quoting every term keeps fts5 syntax (AND, NEAR, column filters, ...) out of user input
+        return ' '.join(f'"{term}"*' for term in terms(query))
+
+    def search(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return queryset.filter(search_entry__document__match=match).annotate(search_rank=F('search_entry__rank'))
+
+    def _select(self):
+        instructor = User._meta.db_table
+        return (
+            f"SELECT course.id, course.title, course.difficulty, instructor.username "
+            f"FROM {Course._meta.db_table} course JOIN {instructor} instructor ON instructor.id = course.instructor_id"
+        )
+
+    def index(self, course_ids):
+        course_ids = list(course_ids)
+        if not course_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(course_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", course_ids)
+            cursor.execute(f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) {self._select()} WHERE course.id IN ({placeholders})", course_ids)
+
+    def remove(self, course_ids):
+        course_ids = list(course_ids)
+        if course_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(course_ids))})", course_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+            cursor.execute(f"INSERT INTO {TABLE}(rowid, {', '.join(COLUMNS)}) {self._select()}")
+            indexed = cursor.rowcount
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')") # merge segments after a bulk load
+        return indexed
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """The backend named by settings.SEARCH_BACKEND, otherwise FTS5 when migration 0008 could create the index."""
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if supports_fts5(connection) and TABLE in connection.introspection.table_names():
+        return Fts5Backend()
+    return LikeBackend()
+
+
+class CourseSearchFilter(BaseFilterBackend):
+    # drop in replacement of rest_framework's SearchFilter for courses, same ?search= parameter
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not terms(query):
+            return queryset
+        return get_backend().search(queryset, query)
@@ -1,6 +1,7 @@
 from .models import *
 from rest_framework import serializers
-from django.core.mail import send_mail
+from .outbox import queue_mail
+from .notifications import broadcast, notify, on_enrolled
 from django.conf import settings
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -41,19 +42,17 @@ class CourseViewSerialiser(serializers.ModelSerializer):
         course = Course.objects.create(**validated_data)
 
         # Get all students
-        students = User.objects.filter(role='student')
-        student_emails = [student.email for student in students]
+        student_emails = User.objects.filter(role='student').values_list('email', flat=True)
 
-        print("Student Emails:", student_emails)  #debugging
+        broadcast(f"New course added {course.title} starting on {course.start_date}", role='student')
 
-        if student_emails:
-            send_mail(
-                subject=f"New Course: {course.title}",
-                message=f"Check out this course by {course.instructor} starting on {course.start_date}. Enhance your skills with '{course.title}'!",
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=student_emails,
-                fail_silently=False
-            )
+        # queued so the request doesnt wait on smtp, the send_queued_mail worker delivers it
+        queue_mail(
+            subject=f"New Course: {course.title}",
+            message=f"Check out this course by {course.instructor} starting on {course.start_date}. Enhance your skills with '{course.title}'!",
+            from_email=settings.EMAIL_HOST_USER,
+            recipient_list=student_emails,
+        )
 
         return course
 
@@ -83,9 +82,9 @@ class EnrollmentSerialiser(serializers.ModelSerializer):
             validated_data['instructor'] = course.instructor
 
         enrollment = Enrollment.objects.create(**validated_data)
+        on_enrolled(user, enrollment.course)
 
-        if User.objects.filter(username = user).exists:
-            Notification.objects.create(user = user,message = f"New Enrollment by {enrollment.student} for course {enrollment.course}")
+        notify(user, f"New Enrollment by {enrollment.student} for course {enrollment.course}")
         
         return enrollment
 
@@ -105,10 +104,8 @@ class AssessmentSerializer(serializers.ModelSerializer):
         validated_data['created_by'] = user
         # saving the validated data instantly because we need it for notification
         assessment = Assessment.objects.create(**validated_data)
-        # creating notification in the serialiser itself because its easier
-        students = User.objects.filter(role = 'student')
-        for student in students:
-            Notification.objects.create(user = student,message = f"New assessment added {assessment.title} deadiline till-{assessment.due_date}")
+        # stored once for the students of this course, their unread counters are bumped with one update
+        broadcast(f"New assessment added {assessment.title} deadiline till-{assessment.due_date}", course=assessment.course)
         
         return assessment
 
@@ -135,8 +132,7 @@ class SubmissionSerialiser(serializers.ModelSerializer):
         
         submission = Submission.objects.create(**validated_data)
 
-        if User.objects.filter(username = user).exists():        
-            Notification.objects.create(user =user,message = f"New submission by {submission.submitted_by.username}")
+        notify(user, f"New submission by {submission.submitted_by.username}")
         
         return submission
     
@@ -177,7 +173,7 @@ class StudentProgressSerialiser(serializers.ModelSerializer):
 
         student = assessment_result.student
 
-        send_mail(
+        queue_mail(
             subject=f"Assessment Report: {assessment_result.assessment}",
             message=(
                 f"Hi {student.username},\n\n"
@@ -196,6 +192,16 @@ class NotificationSerialiser(serializers.ModelSerializer):
         model = Notification
         fields = '__all__'
 
+class NotificationFeedSerialiser(serializers.Serializer):
+    # items of the notification feed, personal notifications and broadcasts share this shape
+    id = serializers.IntegerField()
+    kind = serializers.CharField()
+    message = serializers.CharField()
+    link = serializers.CharField()
+    time = serializers.DateTimeField()
+    is_read = serializers.BooleanField()
+    cursor = serializers.CharField()
+
 class ProgressReportSerialiser(serializers.ModelSerializer):
     class Meta:
         model = Sponsor
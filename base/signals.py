@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, rollups, search, storage
+from .authentication import token_cache
+from .models import AuthToken, Course, Enrollment, NotificationCounter, Sponsor, Submission, User
+
+
+def _previous(sender, instance, field, update_fields):
+    # value of `field` before this save, only looked up when the save can actually change it
+    if instance._state.adding or (update_fields is not None and field not in update_fields):
+        return getattr(instance, field)
+    return sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _previous_values(sender, instance, fields, update_fields):
+    # _previous() for several fields with one query
+    changing = [field for field in fields if update_fields is None or field in update_fields]
+    values = {field: getattr(instance, field) for field in fields}
+    if not instance._state.adding and changing:
+        values.update(sender.objects.filter(pk=instance.pk).values(*changing).first() or dict.fromkeys(changing))
+    return values
+
+
+@receiver(post_save, sender=User)
+def create_notification_counter(sender, instance, created, raw=False, **kwargs):
+    # every user needs a counter row so broadcasts can bump it with a single UPDATE
+    if created and not raw:
+        NotificationCounter.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def remember_role(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        previous = _previous_values(sender, instance, ['role', 'is_active'], update_fields)
+        instance._previous_role, instance._previous_active = previous['role'], previous['is_active']
+
+
+@receiver(post_save, sender=User)
+def forget_cached_tokens(sender, instance, created, raw=False, **kwargs):
+    # cached tokens carry the user, views decide on its role and inactive users may not sign in at all
+    if not raw and not created and (instance._previous_role, instance._previous_active) != (instance.role, instance.is_active):
+        _forget_tokens(list(AuthToken.objects.filter(user=instance).values_list('key', flat=True)))
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_cached_token(sender, instance, **kwargs):
+    _forget_tokens([instance.key])
+
+
+def _forget_tokens(keys):
+    # again after commit, a request that read the old row before it committed may have cached it meanwhile
+    token_cache.invalidate(keys)
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.add(counters.USERS, 1)
+        counters.add(counters.role_key(instance.role), 1)
+    elif instance._previous_role != instance.role:
+        counters.add(counters.role_key(instance._previous_role), -1)
+        counters.add(counters.role_key(instance.role), 1)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    # instructor names are part of the course search index
+    if not raw and instance.role == 'instructor':
+        instance._previous_username = _previous(sender, instance, 'username', update_fields)
+
+
+@receiver(post_save, sender=User)
+def reindex_instructor_courses(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and getattr(instance, '_previous_username', instance.username) != instance.username:
+        search.get_backend().index(Course.objects.filter(instructor=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    counters.add(counters.USERS, -1)
+    counters.add(counters.role_key(instance.role), -1)
+
+
+@receiver(pre_save, sender=Course)
+def remember_active(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        instance._was_active = False if instance._state.adding else _previous(sender, instance, 'is_active', update_fields)
+
+
+@receiver(post_save, sender=Course)
+def count_active_course(sender, instance, raw=False, **kwargs):
+    if not raw and instance._was_active != instance.is_active:
+        counters.add(counters.ACTIVE_COURSES, 1 if instance.is_active else -1)
+
+
+@receiver(post_delete, sender=Course)
+def uncount_course(sender, instance, **kwargs):
+    if instance.is_active:
+        counters.add(counters.ACTIVE_COURSES, -1)
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add(counters.ENROLLMENTS, 1)
+        counters.add(counters.course_key(instance.course_id), 1)
+        rollups.bump(rollups.ENROLLMENTS, instance.enrolled_at)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    counters.add(counters.ENROLLMENTS, -1)
+    counters.add(counters.course_key(instance.course_id), -1)
+    rollups.bump(rollups.ENROLLMENTS, instance.enrolled_at, count=-1)
+
+
+@receiver(post_save, sender=Submission)
+def roll_up_submission(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.bump(rollups.SUBMISSIONS, rollups.submission_day(instance), key=instance.assessment_id)
+
+
+@receiver(post_delete, sender=Submission)
+def roll_back_submission(sender, instance, **kwargs):
+    rollups.bump(rollups.SUBMISSIONS, rollups.submission_day(instance), key=instance.assessment_id, count=-1)
+
+
+@receiver(post_save, sender=Sponsor)
+def roll_up_sponsorship(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.bump(rollups.SPONSORSHIPS, instance.sponsorship_date, total=instance.amount)
+
+
+@receiver(post_delete, sender=Sponsor)
+def roll_back_sponsorship(sender, instance, **kwargs):
+    rollups.bump(rollups.SPONSORSHIPS, instance.sponsorship_date, count=-1, total=-instance.amount)
+
+
+def remember_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    # names the file fields had before this save, one query for all fields of the model
+    fields = [field for field in storage.FILE_FIELDS[sender] if update_fields is None or field in update_fields]
+    instance._previous_files = {}
+    if raw or instance._state.adding or not fields:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._previous_files = {field: previous.get(field) or '' for field in fields}
+
+
+def count_file_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_files', {})
+    added, removed = [], []
+    for field in storage.FILE_FIELDS[sender]:
+        if not created and field not in previous:
+            continue
+        name = getattr(instance, field).name or ''
+        if name != previous.get(field, ''):
+            added.append(name)
+            removed.append(previous.get(field, ''))
+    storage.add_refs(added, 1)
+    storage.add_refs(removed, -1)
+
+
+def uncount_file_refs(sender, instance, **kwargs):
+    storage.add_refs([getattr(instance, field).name for field in storage.FILE_FIELDS[sender]], -1)
+
+
+# blobs of the content addressed storage count the rows that point at them
+for model in storage.FILE_FIELDS:
+    pre_save.connect(remember_files, sender=model, dispatch_uid=f'remember_files_{model.__name__}')
+    post_save.connect(count_file_refs, sender=model, dispatch_uid=f'count_file_refs_{model.__name__}')
+    post_delete.connect(uncount_file_refs, sender=model, dispatch_uid=f'uncount_file_refs_{model.__name__}')
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+from django.utils._os import safe_join
+
+from .models import Assessment, Blob, Sponsor, Submission, User
+
+PREFIX = 'cas/'
+BLOB_DIR = 'blobs'
+BLOCK_SIZE = 64 * 1024
+
+# every file field that stores its files here, with the signals in base/signals.py keeping Blob.refs
+FILE_FIELDS = {
+    User: ['image'],
+    Assessment: ['file'],
+    Submission: ['add_file'],
+    Sponsor: ['report_file'],
+}
+
+
+def digest_of(name):
+    """sha256 of a stored name (cas/<sha256>/<filename>), None for files saved before this storage."""
+    if not name or not name.startswith(PREFIX):
+        return None
+    digest = name[len(PREFIX):].split('/', 1)[0]
+    return digest if len(digest) == 64 else None
+
+
+def add_refs(names, delta):
+    # names that share a blob each count once
+    counts = {}
+    for name in names:
+        digest = digest_of(name)
+        if digest:
+            counts[digest] = counts.get(digest, 0) + delta
+    for digest, change in counts.items():
+        Blob.objects.filter(sha256=digest).update(refs=F('refs') + change)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Local storage that keeps every distinct file content once.
+
+    Files are hashed while they are written and stored as blobs/<2 hex>/<sha256>. The name handed back is
+    cas/<sha256>/<original filename>, so rows keep a readable filename while identical uploads share one blob.
+    Deleting a name never removes the blob, `manage.py gc_blobs` removes blobs nothing references any more.
+    Names from before this storage are served from their old place.
+
+    Blobs have no extension on disk, so a web server serving MEDIA_ROOT directly cannot tell their content type.
+    Files are meant to be sent with base.downloads.serve(), which takes the type and the download filename from
+    the name and also checks who may see them.
+    """
+
+    def blob_path(self, digest):
+        return safe_join(self.location, BLOB_DIR, digest[:2], digest)
+
+    def path(self, name):
+        digest = digest_of(name)
+        return self.blob_path(digest) if digest else super().path(name)
+
+    def url(self, name):
+        # where the file really is under MEDIA_ROOT, the cas/ name is not a path on disk. Without an extension a
+        # static file server sends it untyped, links for users go through the download routes (see serve())
+        digest = digest_of(name)
+        return super().url(f'{BLOB_DIR}/{digest[:2]}/{digest}' if digest else name)
+
+    def get_available_name(self, name, max_length=None):
+        # the final name depends on the content, it is only known in _save
+        return name
+
+    def _name(self, digest, name, max_length=None):
+        filename = os.path.basename(name) or 'file'
+        room = (max_length or 100) - len(PREFIX) - len(digest) - 1
+        if len(filename) > room:
+            stem, extension = os.path.splitext(filename)
+            filename = stem[:max(1, room - len(extension))] + extension[:max(0, room - 1)]
+        return f'{PREFIX}{digest}/{filename}'
+
+    def _save(self, name, content):
+        os.makedirs(os.path.join(self.location, BLOB_DIR, 'tmp'), exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        # written to a temporary file while hashing, it only gets its final name once the hash is known
+        with tempfile.NamedTemporaryFile(dir=os.path.join(self.location, BLOB_DIR, 'tmp'), delete=False) as temporary:
+            try:
+                if hasattr(content, 'seek') and content.seekable():
+                    content.seek(0)
+                for chunk in content.chunks(BLOCK_SIZE):
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        return self._adopt(temporary.name, digest.hexdigest(), size, name)
+
+    def adopt(self, path, name, max_length=None):
+        """Store the local file at `path` by moving it into place instead of copying it, returns the new name."""
+        digest, size = hashlib.sha256(), 0
+        with open(path, 'rb') as source:
+            while block := source.read(BLOCK_SIZE):
+                digest.update(block)
+                size += len(block)
+        return self._adopt(path, digest.hexdigest(), size, name, max_length)
+
+    def _adopt(self, path, digest, size, name, max_length=None):
+        # the row is touched before the file is looked at, gc then either skips the blob or puts it back, see
+        # collect_garbage
+        Blob.objects.update_or_create(sha256=digest, defaults={'size': size, 'touched_at': timezone.now()})
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            os.remove(path) # same content is already stored
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+            os.replace(path, target)
+        return self._name(digest, name, max_length)
+
+    def delete(self, name):
+        if digest_of(name) is None:
+            super().delete(name)
+
+
+def _remove_blob_file(path, digest):
+    # moved aside first: a save that touched the row after it was deleted may already have found the file in
+    # place and dropped its own copy, then the file is put back
+    trash = f'{path}.deleted'
+    try:
+        os.replace(path, trash)
+    except FileNotFoundError:
+        return
+    if Blob.objects.filter(sha256=digest).exists():
+        os.replace(trash, path)
+    else:
+        os.remove(trash)
+
+
+def collect_garbage(grace=timedelta(days=1), dry_run=False):
+    """Remove blobs without references and blob files without a row, both only when older than `grace`.
+
+    Returns (blobs removed, bytes freed).
+    """
+    from django.core.files.storage import default_storage
+
+    cutoff = timezone.now() - grace
+    removed, freed = 0, 0
+    unreferenced = Blob.objects.filter(refs__lte=0, touched_at__lt=cutoff)
+    for digest, size in unreferenced.values_list('sha256', 'size'):
+        if not dry_run:
+            # the row goes first and only while it is still unreferenced and untouched, a save of the same content
+            # since the query above keeps the blob
+            if not Blob.objects.filter(sha256=digest, refs__lte=0, touched_at__lt=cutoff).delete()[0]:
+                continue
+            _remove_blob_file(default_storage.blob_path(digest), digest)
+        removed, freed = removed + 1, freed + size
+
+    # files whose save never committed its row, and temporary files of crashed writes
+    known = set(Blob.objects.values_list('sha256', flat=True))
+    root = os.path.join(default_storage.location, BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if filename in known or os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            size = os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+            removed, freed = removed + 1, freed + size
+    return removed, freed
+
+
+def recount_refs():
+    """Recompute Blob.refs from the file fields, for refs that drifted (raw sql, bulk inserts)."""
+    counts = {}
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            for name in model.objects.filter(**{f'{field}__startswith': PREFIX}).values_list(field, flat=True).iterator():
+                digest = digest_of(name)
+                if digest:
+                    counts[digest] = counts.get(digest, 0) + 1
+    drift = 0
+    for digest, refs in Blob.objects.values_list('sha256', 'refs'):
+        if counts.get(digest, 0) != refs:
+            Blob.objects.filter(sha256=digest).update(refs=counts.get(digest, 0))
+            drift += 1
+    return drift
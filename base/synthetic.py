@@ -0,0 +1,254 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, time as clock, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import *
+
+# defaults of the generator, `manage.py generate_data --help` lists the matching options
+DEFAULTS = {
+    'students': 10000,
+    'instructors': 200,
+    'sponsors': 100,
+    'admins': 2,
+    'courses': 1000,
+    'mean_enrollments': 30,        # average students per course
+    'enrollment_alpha': 1.5,       # pareto shape, lower means a heavier tail of very popular courses
+    'assessments_per_course': 4,
+    'submission_rate': 0.7,        # share of enrolled students that submit each assessment
+    'sponsorships_per_sponsor': 20,
+    'notifications_per_student': 5,
+    'start_date': date(2024, 1, 1),
+    'days': 365,
+    'password': 'password123',
+    'prefix': 'synthetic',
+    'chunk_size': 5000,
+    'seed': 0,
+}
+
+# auto_now_add would stamp every generated row with "now", which makes time series useless
+TIMESTAMPED = [
+    (Enrollment, 'enrolled_at'),
+    (Assessment, 'created_at'),
+    (Submission, 'submitted_at'),
+    (Sponsor, 'sponsorship_date'),
+    (Notification, 'time'),
+]
+
+
+@contextmanager
+def _explicit_timestamps():
+    fields = [model._meta.get_field(name) for model, name in TIMESTAMPED]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Generator:
+    """Deterministic streaming generator of a whole LMS dataset.
+
+    Rows are produced lazily and written with bulk_create in chunks, so memory is bounded by the chunk size
+    plus one 8 byte id per user, course and assessment. Everything random comes from `seed`: the same options
+    always produce the same rows.
+    """
+
+    def __init__(self, log=None, **options):
+        self.options = {**DEFAULTS, **options}
+        self.log = log or (lambda message: None)
+        self.counts = {}
+        self.ids = {role: array('q') for role, _ in User.ROLE_CHOICES}
+        self.course_ids = array('q')
+        self.course_instructors = array('q')
+        self.course_sizes = array('l')
+        self.assessment_ids = array('q') # assessments of course n are at [n * assessments_per_course, ...)
+
+    def rng(self, *key):
+        # an independent random stream per (table, position) so any part can be regenerated on its own
+        return random.Random(f"{self.options['seed']}:{':'.join(map(str, key))}")
+
+    def moment(self, rng):
+        day = self.options['start_date'] + timedelta(days=rng.randrange(self.options['days']))
+        return datetime.combine(day, clock(rng.randrange(24), rng.randrange(60)), tzinfo=dt_timezone.utc)
+
+    def write(self, model, rows, keep=None):
+        """bulk_create `rows` in chunks; `keep(objects)` receives every written chunk (used to remember ids)."""
+        chunk_size = self.options['chunk_size']
+        started = time.perf_counter()
+        written = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                written += self._flush(model, chunk, keep)
+                chunk = []
+        if chunk:
+            written += self._flush(model, chunk, keep)
+        seconds = time.perf_counter() - started
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + written
+        self.log(f"{model.__name__}: {written} rows in {seconds:.1f}s ({written / seconds if seconds else written:.0f}/s)")
+
+    def _flush(self, model, chunk, keep):
+        with transaction.atomic():
+            objects = model.objects.bulk_create(chunk)
+        if keep:
+            keep(objects)
+        return len(objects)
+
+    def enrolled_students(self, course):
+        # enrollments are never kept in memory, they are regenerated from the course position when needed
+        rng = self.rng('enrollment', course)
+        students = self.ids['student']
+        return sorted(rng.sample(range(len(students)), min(self.course_sizes[course], len(students))))
+
+    def users(self):
+        options = self.options
+        password = make_password(options['password']) # hashed once, every generated user shares it
+        for role, _ in User.ROLE_CHOICES:
+            total = options[f'{role}s']
+            rows = (
+                User(username=f"{options['prefix']}_{role}{number}", email=f"{options['prefix']}_{role}{number}@example.com",
+                     password=password, role=role)
+                for number in range(total)
+            )
+            self.write(User, rows, keep=lambda objects, role=role: self.ids[role].extend(user.pk for user in objects))
+
+    def courses(self):
+        options = self.options
+        # pareto sizes scaled so the average course has `mean_enrollments` students
+        alpha = options['enrollment_alpha']
+        minimum = options['mean_enrollments'] * (alpha - 1) / alpha if alpha > 1 else 1
+        instructors = self.ids['instructor']
+
+        def rows():
+            for number in range(options['courses']):
+                rng = self.rng('course', number)
+                self.course_sizes.append(max(1, min(len(self.ids['student']), int(minimum * rng.paretovariate(alpha)))))
+                start = options['start_date'] + timedelta(days=rng.randrange(options['days']))
+                yield Course(title=f"{options['prefix']} course {number}", difficulty=rng.choice(['easy', 'intermediate', 'hard']),
+                             instructor_id=instructors[rng.randrange(len(instructors))], start_date=start,
+                             end_date=start + timedelta(days=rng.choice([30, 60, 90, 180])), is_active=rng.random() < 0.9)
+
+        def keep(objects):
+            self.course_ids.extend(course.pk for course in objects)
+            self.course_instructors.extend(course.instructor_id for course in objects)
+
+        self.write(Course, rows(), keep=keep)
+
+    def enrollments(self):
+        students = self.ids['student']
+
+        def rows():
+            for course in range(len(self.course_ids)):
+                rng = self.rng('enrollment-dates', course)
+                for student in self.enrolled_students(course):
+                    yield Enrollment(course_id=self.course_ids[course], student_id=students[student],
+                                     instructor_id=self.course_instructors[course], status='enrolled',
+                                     enrolled_at=self.moment(rng).date(), progress=rng.randrange(101))
+
+        self.write(Enrollment, rows())
+
+    def assessments(self):
+        per_course = self.options['assessments_per_course']
+
+        def rows():
+            for course in range(len(self.course_ids)):
+                rng = self.rng('assessment', course)
+                for number in range(per_course):
+                    created = self.moment(rng)
+                    yield Assessment(file=f'assessments/{course}-{number}.pdf', course_id=self.course_ids[course],
+                                     title=f"Assessment {number}", description='synthetic', due_date=created.date() + timedelta(days=14),
+                                     max_score=100, difficulty_level=rng.choice(['Beginner', 'Intermediate', 'Advanced']),
+                                     created_at=created, created_by_id=self.course_instructors[course])
+
+        self.write(Assessment, rows(), keep=lambda objects: self.assessment_ids.extend(assessment.pk for assessment in objects))
+
+    def _submitted(self):
+        # (course position, assessment position, student position) of every generated submission, random
+        # streams are keyed by positions and never by database ids so reruns match on a non empty database
+        rate = self.options['submission_rate']
+        per_course = self.options['assessments_per_course']
+        for course in range(len(self.course_ids)):
+            enrolled = self.enrolled_students(course)
+            for assessment in range(course * per_course, (course + 1) * per_course):
+                rng = self.rng('submission', assessment)
+                for student in enrolled:
+                    if rng.random() < rate:
+                        yield course, assessment, student
+
+    def submissions(self):
+        students = self.ids['student']
+        self.write(Submission, (
+            Submission(assessment_id=self.assessment_ids[assessment], add_file=f'submissions/{assessment}-{student}.pdf',
+                       submitted_by_id=students[student], submitted_at=self.moment(self.rng('submitted', assessment, student)))
+            for _, assessment, student in self._submitted()
+        ))
+
+    def progress(self):
+        students = self.ids['student']
+        self.write(StudentProgress, (
+            StudentProgress(assessment_id=self.assessment_ids[assessment], student_id=students[student],
+                            instructor_id=self.course_instructors[course], is_completed=True,
+                            marks_obtained=min(100, max(0, int(self.rng('marks', assessment, student).gauss(65, 15)))))
+            for course, assessment, student in self._submitted()
+        ))
+
+    def sponsorships(self):
+        options = self.options
+        students = self.ids['student']
+
+        def rows():
+            for position, sponsor in enumerate(self.ids['sponsor']):
+                rng = self.rng('sponsor', position)
+                funded = min(len(students), max(1, int(rng.expovariate(1 / options['sponsorships_per_sponsor']))))
+                for student in rng.sample(range(len(students)), funded):
+                    yield Sponsor(sponsor_id=sponsor, student_id=students[student], amount=int(rng.lognormvariate(7, 1)),
+                                  sponsorship_date=self.moment(rng).date(), transaction_id=f"{options['prefix']}-{sponsor}-{students[student]}")
+
+        self.write(Sponsor, rows())
+
+    def _notification_plan(self, student):
+        # (number, time, is_read) of the notifications of the student at this position, replayed for the counters
+        mean = self.options['notifications_per_student']
+        rng = self.rng('notification', student)
+        for number in range(int(rng.expovariate(1 / mean)) if mean else 0):
+            yield number, self.moment(rng), rng.random() < 0.6
+
+    def notifications(self):
+        self.write(Notification, (
+            Notification(user_id=user_id, message=f"Synthetic notification {number}", time=moment, is_read=is_read)
+            for student, user_id in enumerate(self.ids['student'])
+            for number, moment, is_read in self._notification_plan(student)
+        ))
+
+    def counters(self):
+        # bulk_create skips the post_save receiver, so every generated user gets its counter here
+        def unread(role, position):
+            if role != 'student':
+                return 0
+            return sum(not is_read for _, _, is_read in self._notification_plan(position))
+
+        self.write(NotificationCounter, (
+            NotificationCounter(user_id=user_id, unread=unread(role, position))
+            for role, ids in self.ids.items() for position, user_id in enumerate(ids)
+        ))
+
+    def run(self):
+        with _explicit_timestamps():
+            self.users()
+            self.courses()
+            self.enrollments()
+            self.assessments()
+            self.submissions()
+            self.progress()
+            self.sponsorships()
+            self.notifications()
+            self.counters()
+        return self.counts
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class ReplicaMirrorRunner(DiscoverRunner):
+    """Runs the tests with every read on the primary.
+
+    The replica aliases are TEST['MIRROR']s of the primary, but they open their own connections. Those connections
+    fail the databases guard of TestCase and could not see the rows it has not committed anyway. The routing tests
+    set DATABASE_REPLICAS themselves.
+    """
+
+    def run_tests(self, *args, **kwargs):
+        with override_settings(DATABASE_REPLICAS=[]):
+            return super().run_tests(*args, **kwargs)
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .authentication import token_cache
+from .models import AuthToken
+
+ROTATE_AFTER = timedelta(seconds=getattr(settings, 'AUTH_TOKEN_ROTATE_AFTER', 24 * 3600))
+GRACE = timedelta(seconds=getattr(settings, 'AUTH_TOKEN_GRACE', 60))
+SWEEP_BATCH_SIZE = 1000
+
+
+def for_login(user):
+    """Token handed out at login: the user's newest one while it is fresh, else a new one.
+
+    Clients that log in again and again keep getting the same token instead of piling up rows, older tokens
+    of the user keep working until they expire.
+    """
+    now = timezone.now()
+    token = AuthToken.objects.filter(user=user, expires_at__gt=now).order_by('-created_at').first()
+    if token is None or token.created_at <= now - ROTATE_AFTER:
+        token = AuthToken.objects.create(user=user)
+    return token
+
+
+class RotationError(Exception):
+    """The token was already replaced and only lives on for its grace period."""
+
+
+def rotate(token):
+    """Replace `token` with a new one. The old one still works for GRACE, for requests already sent with it.
+
+    A token that is already in its grace period cannot be rotated again, otherwise it could be used to mint
+    replacements until it finally expires.
+    """
+    with transaction.atomic():
+        # shortening the old token first also decides which of two concurrent rotations wins
+        ends = timezone.now() + GRACE
+        if not AuthToken.objects.filter(pk=token.pk, expires_at__gt=ends).update(expires_at=ends):
+            raise RotationError("token was already refreshed, use the new one")
+        new = AuthToken.objects.create(user=token.user)
+    # cached copies still carry the old expiry
+    token_cache.invalidate([token.key])
+    return new
+
+
+def sweep(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Delete expired tokens batch by batch, each batch in its own short transaction. Returns how many went."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        keys = list(AuthToken.objects.filter(expires_at__lte=now).values_list('key', flat=True)[:batch_size])
+        if not keys:
+            return removed
+        removed += AuthToken.objects.filter(key__in=keys).delete()[0]
@@ -0,0 +1,195 @@
+import glob
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Enrollment, Submission, UploadSession
+from .notifications import notify
+
+MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+MAX_CHUNK_SIZE = getattr(settings, 'UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 ** 2)
+CHUNK_SIZE = getattr(settings, 'UPLOAD_CHUNK_SIZE', 5 * 1024 ** 2) # suggested to clients
+SESSION_TTL = timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600))
+BLOCK_SIZE = 64 * 1024 # bytes read from the request at a time
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """A request that does not fit the upload, `status` is the http status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(session):
+    # part files live under MEDIA_ROOT, so finishing an upload on the local filesystem is a rename
+    return os.path.join(settings.MEDIA_ROOT, 'partial', f'{session.pk}.part')
+
+
+def can_upload(user, target, assessment):
+    # the same rules as AssessmentListCreateView.post and SubmissionView.post
+    if target == 'assessment':
+        return user.role == 'instructor' and assessment.course.instructor_id == user.id
+    return user.role == 'student' and Enrollment.objects.filter(course_id=assessment.course_id, student=user).exists()
+
+
+def start(user, target, assessment, filename, size):
+    if not 0 < size <= MAX_SIZE:
+        raise UploadError(f"size must be between 1 and {MAX_SIZE} bytes")
+    if not can_upload(user, target, assessment):
+        raise UploadError("You cannot upload files for this assessment", status=403)
+    session = UploadSession.objects.create(
+        user=user, target=target, assessment=assessment, filename=os.path.basename(filename)[:255] or 'upload',
+        size=size, expires_at=timezone.now() + SESSION_TTL,
+    )
+    os.makedirs(os.path.dirname(partial_path(session)), exist_ok=True)
+    open(partial_path(session), 'wb').close()
+    return session
+
+
+def status(session):
+    return {
+        'id': session.pk,
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'chunk_size': CHUNK_SIZE,
+        'expires_at': session.expires_at,
+        'complete': session.completed_at is not None,
+        'checksum': checksum(session) if session.completed_at else None,
+        'submission': session.submission_id,
+    }
+
+
+def parse_range(header, session):
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise UploadError("Content-Range: bytes <first>-<last>/<size> is required")
+    first, last, total = map(int, match.groups())
+    if total != session.size or last < first or last >= total:
+        raise UploadError("Content-Range does not fit the upload")
+    if last - first + 1 > MAX_CHUNK_SIZE:
+        raise UploadError(f"chunks may be at most {MAX_CHUNK_SIZE} bytes")
+    if first != session.offset:
+        # a retried or out of order chunk, the client resumes from the offset in the answer
+        raise UploadError(f"expected the chunk at offset {session.offset}", status=409)
+    return first, last
+
+
+def _receive(session, stream, first, last, chunk_checksum):
+    # the chunk is read from the client into a file of its own, parallel retries of the same chunk never write
+    # to the same file. Returns its path and sha256
+    expected = last - first + 1
+    path = f'{partial_path(session)}.{first}.{uuid.uuid4().hex}'
+    digest, received = hashlib.sha256(), 0
+    with open(path, 'wb') as chunk:
+        while received < expected:
+            block = stream.read(min(BLOCK_SIZE, expected - received))
+            if not block:
+                break
+            digest.update(block)
+            chunk.write(block)
+            received += len(block)
+    if received != expected or stream.read(1) or digest.hexdigest() != (chunk_checksum or '').lower():
+        os.remove(path)
+        raise UploadError("chunk length or checksum does not match, send it again")
+    return path, digest.hexdigest()
+
+
+def write_chunk(session_id, user, stream, content_range, chunk_checksum):
+    """Append one chunk read from `stream` and verify it against its sha256 `chunk_checksum`.
+
+    The chunk is received and hashed before any transaction is opened, a slow client holds no lock. A chunk
+    with a wrong checksum or length is dropped. The last chunk completes the upload.
+    """
+    session = UploadSession.objects.select_related('user', 'assessment').get(pk=session_id, user=user)
+    if session.completed_at or session.expires_at <= timezone.now():
+        raise UploadError("This upload is finished or expired", status=410)
+    first, last = parse_range(content_range, session)
+    if stream is None:
+        raise UploadError("the request has no body")
+
+    chunk_path, digest = _receive(session, stream, first, last, chunk_checksum)
+    try:
+        with transaction.atomic():
+            # only one of the requests sending the chunk at this offset moves the offset on, the others get a 409
+            if not UploadSession.objects.filter(pk=session.pk, offset=first, completed_at__isnull=True).update(offset=last + 1):
+                raise UploadError("this chunk was received already", status=409)
+            session.refresh_from_db(fields=['digests'])
+            with open(chunk_path, 'rb') as chunk, open(partial_path(session), 'r+b') as part:
+                part.seek(first)
+                shutil.copyfileobj(chunk, part, BLOCK_SIZE)
+            session.offset = last + 1
+            session.digests.append(digest)
+            if session.offset == session.size:
+                finish(session)
+            session.save()
+    finally:
+        os.remove(chunk_path)
+    return session
+
+
+def checksum(session):
+    # sha256 over the chunk digests (like multipart etags), covers every byte without reading the file again
+    return hashlib.sha256(''.join(session.digests).encode()).hexdigest()
+
+
+def _store(session):
+    path = partial_path(session)
+    if hasattr(default_storage, 'adopt'):
+        # content addressed storage hashes the part file once and moves it into place
+        return default_storage.adopt(path, session.filename)
+    name = default_storage.get_available_name(session.filename)
+    try:
+        final = default_storage.path(name)
+    except NotImplementedError:
+        final = None
+    if final:
+        # local storage: the part file becomes the final file with a rename, nothing is copied
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(path, final)
+        return name
+    with open(path, 'rb') as part:
+        name = default_storage.save(session.filename, File(part))
+    os.remove(path)
+    return name
+
+
+def finish(session):
+    name = _store(session)
+    if session.target == 'assessment':
+        assessment = session.assessment
+        assessment.file = name
+        assessment.save(update_fields=['file'])
+    else:
+        session.submission = Submission.objects.create(assessment=session.assessment, add_file=name, submitted_by=session.user)
+        notify(session.user, f"New submission by {session.user.username}")
+    session.completed_at = timezone.now()
+
+
+def cancel(session):
+    # the part file and any chunk left behind by a request that died while receiving it
+    for path in glob.glob(glob.escape(partial_path(session)) + '*'):
+        os.remove(path)
+    session.delete()
+
+
+def clean_expired(now=None):
+    """Delete abandoned uploads and their part files, returns how many were removed."""
+    expired = UploadSession.objects.filter(completed_at__isnull=True, expires_at__lte=now or timezone.now())
+    removed = 0
+    for session in list(expired):
+        cancel(session)
+        removed += 1
+    return removed
@@ -3,18 +3,39 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import *
 from .serializers import *
-from rest_framework.authtoken.models import Token
+from . import tokens
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import Group
 from rest_framework import generics, permissions
 from rest_framework.exceptions import PermissionDenied
-from rest_framework import filters
 from django.http import JsonResponse
 from django.contrib.auth.decorators import user_passes_test
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Sum, Q,Avg
-from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
-from django.core.mail import EmailMessage
+from .outbox import queue_mail, outbox_status
+from .authentication import token_cache
+from . import profiling
+from decimal import Decimal, InvalidOperation
+from . import counters, rollups
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .dashboards import sponsored_students
+from .routers import read_from_replica
+from .search import CourseSearchFilter, terms
+from .exports import DATASETS, FORMATS, export_stream
+from .enrollments import MAX_ITEMS, bulk_enroll
+from .gradebook import GradebookError, Import, read_gradebook
+from . import uploads
+from .archives import UNSAFE, archive_stream, manifest
+from .downloads import REPORT_LINK_MAX_AGE, read_report_token, report_token, serve
+from django.core import signing
+from django.urls import reverse
+from django.http import HttpResponse, StreamingHttpResponse
+from .notifications import decode_cursor, encode_cursor, feed, mark_read, unread_count
+from rest_framework.utils.urls import replace_query_param
 
 
 class RegisterUserView(CreateAPIView):
@@ -45,26 +66,43 @@ def login(request):
     if user is None:
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    token, _ = Token.objects.get_or_create(user=user) # we need 2 fields as get or create returns boolean also
-    return Response({'token': token.key, 'role': user.role}, status=status.HTTP_200_OK) #again being neat with it
+    token = tokens.for_login(user) # the same token again while it is fresh, see base/tokens.py
+    return Response({'token': token.key, 'role': user.role, 'expires_at': token.expires_at}, status=status.HTTP_200_OK) #again being neat with it
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def token_refresh_api(request):
+    # a new token for the one the request was made with, the old one keeps working for a minute
+    try:
+        token = tokens.rotate(request.auth)
+    except tokens.RotationError as error:
+        return Response({'Error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'token': token.key, 'expires_at': token.expires_at}, status=status.HTTP_201_CREATED)
 
 class CourseView(GenericAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('instructor') # instructor is rendered through User.__str__
     serializer_class = CourseViewSerialiser
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'difficulty', 'instructor__username']
+    filter_backends = [CourseSearchFilter]
+
+    @property
+    def keyset_ordering(self):
+        # best matches first while searching
+        if terms(self.request.query_params.get('search', '')):
+            return ('search_rank', 'id')
+        return ('start_date', 'id')
 
+    @read_from_replica
     def get(self, request):
-        queryset = self.get_queryset()
-        queryset = self.filter_queryset(queryset)
-        paginated_data = self.paginate_queryset(queryset)
+        queryset = self.filter_queryset(self.get_queryset())
 
         # Check user role and filter courses accordingly
         if request.user.role == 'instructor':
-            course = queryset.filter(instructor=request.user)
-        else:
-            course = queryset  # Others can view all courses
+            queryset = queryset.filter(instructor=request.user)
+        # Others can view all courses
+
+        paginated_data = self.paginate_queryset(queryset)
 
         # Serialize and paginate the course data
         serializer = self.get_serializer(paginated_data, many=True)
@@ -90,7 +128,7 @@ class CourseView(GenericAPIView):
 
     
 class CoursedetailView(GenericAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('instructor')
     serializer_class = CourseViewSerialiser
     permission_classes = [IsAuthenticated]
 
@@ -108,17 +146,21 @@ class CoursedetailView(GenericAPIView):
                 return Response(serialiser.data,status=status.HTTP_200_OK)
 
 class EnrollmentView(GenericAPIView): # only student can enroll, if already enrolled no duplication
-    queryset = Enrollment.objects.all()
+    # everything the serialiser reads is joined in, so listing costs one query however many rows there are
+    queryset = Enrollment.objects.select_related('student', 'course__instructor').only(
+        'status', 'enrolled_at', 'course_id', 'student_id', 'instructor_id',
+        'student__username', 'course__title', 'course__instructor__username',
+    )
     serializer_class = EnrollmentSerialiser
     permission_classes = [IsAuthenticated]
 
     def get(self,request):
         if request.user.role == 'student':
-            enrolled_in = Enrollment.objects.filter(student_id = request.user)
+            enrolled_in = self.get_queryset().filter(student_id = request.user)
             serialiser = self.get_serializer(enrolled_in,many = True)
             return Response(serialiser.data,status=status.HTTP_200_OK)
         elif request.user.role == 'instructor':
-            course_enrollment= Enrollment.objects.filter(instructor_id = request.user)
+            course_enrollment= self.get_queryset().filter(instructor_id = request.user)
             serialiser = self.get_serializer(course_enrollment,many = True)
             return Response(serialiser.data,status=status.HTTP_200_OK)
         else:
@@ -132,29 +174,50 @@ class EnrollmentView(GenericAPIView): # only student can enroll, if already enro
                 return Response({'enrolled':'You are already enrolled'},status=status.HTTP_400_BAD_REQUEST)
             serialiser = EnrollmentSerialiser(data = request.data,context = {'request':request})
             if serialiser.is_valid():
-                serialiser.save()
+                try:
+                    with transaction.atomic():
+                        serialiser.save()
+                except IntegrityError: # a parallel request enrolled them after the check above
+                    return Response({'enrolled':'You are already enrolled'},status=status.HTTP_400_BAD_REQUEST)
                 return Response(serialiser.data,status=status.HTTP_201_CREATED)
             return Response(serialiser.errors,status=status.HTTP_400_BAD_REQUEST)
         
         return Response({'Forbidden':'You are not allowed to enroll in courses'},status=status.HTTP_403_FORBIDDEN)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_enrollment_api(request):
+    # {"enrollments": [{"student": id, "course": id}, ...]}, a whole cohort in one request
+    if request.user.role not in ('admin', 'instructor'):
+        return Response({'Forbidden':'Only admins and instructors can enroll students'},status=status.HTTP_403_FORBIDDEN)
+    items = request.data.get('enrollments')
+    if not isinstance(items, list) or not 0 < len(items) <= MAX_ITEMS:
+        return Response({'Error':f'enrollments must be a list of 1 to {MAX_ITEMS} {{"student", "course"}} items'},status=status.HTTP_400_BAD_REQUEST)
+
+    results = bulk_enroll(request.user, items)
+    enrolled = sum(result['status'] == 'enrolled' for result in results)
+    return Response({'enrolled': enrolled, 'results': results}, status=status.HTTP_201_CREATED if enrolled else status.HTTP_200_OK)
+
 class AssessmentListCreateView(GenericAPIView):
-    queryset = Assessment.objects.all()
+    queryset = Assessment.objects.select_related('created_by').only(
+        'course_id', 'title', 'description', 'due_date', 'max_score', 'difficulty_level', 'created_at', 'created_by__username',
+    )
     serializer_class = AssessmentSerializer
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self,request):
         user = self.request.user
         
         if user.role == 'student':
             student_enrollment = Enrollment.objects.filter(student = request.user).values_list('course_id', flat=True) #sending whole list from the database
-            assessment_objs = Assessment.objects.filter(course_id__in= student_enrollment) #__in field helps us look one by one in a field it is called as a look up field 
+            assessment_objs = self.get_queryset().filter(course_id__in= student_enrollment) #__in field helps us look one by one in a field it is called as a look up field 
             serialiser = self.get_serializer(assessment_objs,many = True)
             return Response(serialiser.data,status=status.HTTP_200_OK)
 
         elif user.role == 'instructor':
             instructor_course = Course.objects.filter(instructor = request.user).values_list('id',flat=True)
-            created_courses = Assessment.objects.filter(course_id__in = instructor_course)
+            created_courses = self.get_queryset().filter(course_id__in = instructor_course)
             serialiser = self.get_serializer(created_courses,many = True)
             return Response(serialiser.data,status=status.HTTP_200_OK)
 
@@ -178,7 +241,9 @@ class AssessmentListCreateView(GenericAPIView):
         return Response({"detail": "You are not authorized to create an assessment for this course."},status=status.HTTP_403_FORBIDDEN)
 
 class SubmissionView(GenericAPIView):
-    queryset = Submission.objects.all()
+    queryset = Submission.objects.select_related('submitted_by').only(
+        'assessment_id', 'add_file', 'submitted_at', 'submitted_by__username',
+    )
     serializer_class = SubmissionSerialiser
     permission_classes = [IsAuthenticated]
     
@@ -187,7 +252,7 @@ class SubmissionView(GenericAPIView):
         user = request.user
 
         if user.role == 'instructor':
-            submissions = Submission.objects.filter(assessment__created_by=user) # using django orm lookup field to search for assessment created by user
+            submissions = self.get_queryset().filter(assessment__created_by=user) # using django orm lookup field to search for assessment created by user
             serializer = self.get_serializer(submissions, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -218,9 +283,12 @@ class SubmissionView(GenericAPIView):
         return Response({'Forbidden':'Only students can submit courses'},status=status.HTTP_403_FORBIDDEN)
 
 class SponsorView(GenericAPIView):
-    queryset = Sponsor.objects.all()
+    queryset = Sponsor.objects.select_related('student', 'sponsor').only(
+        'amount', 'sponsorship_date', 'transaction_id', 'student__username', 'sponsor__username',
+    )
     serializer_class = SponsorSerialiser
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('sponsorship_date', 'id')
 
     def get(self, request):
         user = request.user
@@ -250,9 +318,12 @@ class SponsorView(GenericAPIView):
 
     
 class StudentProgressView(GenericAPIView):
-    queryset = StudentProgress.objects.all()
+    queryset = StudentProgress.objects.select_related('student').only(
+        'assessment_id', 'is_completed', 'marks_obtained', 'student__username',
+    )
     serializer_class = StudentProgressSerialiser
     permission_classes = [IsAuthenticated]
+    keyset_ordering = ('id',)
 
     def get(self, request):
         user = request.user
@@ -289,7 +360,11 @@ class StudentProgressView(GenericAPIView):
         # Validate and save
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError: # a parallel request recorded it after the check above
+                return Response({'Already recorded': 'This student has their progress already recorded'}, status=400)
             return Response(serializer.data, status=201)
 
         return Response(serializer.errors, status=400)
@@ -299,24 +374,151 @@ class StudentProgressView(GenericAPIView):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def admin_dashboard_api(request):
     if request.user.role != 'admin':
         return Response({'Error':'You are not an admin user'},status=403)
     
-    total_user = User.objects.count()
-    active_course = Course.objects.filter(is_active=True).count()
-    total_enrollment = Enrollment.objects.count()
+    # totals are maintained by signals and cached, see base/counters.py
+    roles = [role for role, _ in User.ROLE_CHOICES]
+    keys = [counters.USERS, counters.ACTIVE_COURSES, counters.ENROLLMENTS] + [counters.role_key(role) for role in roles]
+    course_id = request.GET.get('course')
+    if course_id:
+        if not course_id.isdigit():
+            return Response({'Error':'course must be a course id'},status=400)
+        keys.append(counters.course_key(int(course_id)))
+    values = counters.get_many(keys)
 
     data = {
-        "total_users":total_user,
-        "active_courses":active_course,
-        "total_enrollment":total_enrollment
+        "total_users":values[counters.USERS],
+        "active_courses":values[counters.ACTIVE_COURSES],
+        "total_enrollment":values[counters.ENROLLMENTS],
+        "users_by_role":{role: values[counters.role_key(role)] for role in roles},
     }
+    if course_id:
+        data["course_enrollment"] = values[counters.course_key(int(course_id))]
     return Response(data)
 
 
+def _date_range(request, default_days):
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, both optional; raises ValueError for bad dates
+    end = parse_date(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+    start = parse_date(request.GET['start']) if request.GET.get('start') else end - timedelta(days=default_days)
+    if start is None or end is None or start > end:
+        raise ValueError
+    return start, end
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def enrollment_analytics_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+    try:
+        start, end = _date_range(request, 30)
+    except ValueError:
+        return Response({'Error':'start and end must be dates (YYYY-MM-DD), start before end'},status=400)
+
+    # only the daily buckets are read, see base/rollups.py
+    days = [{"day": row['day'], "enrollments": row['count']} for row in rollups.daily(rollups.ENROLLMENTS, start, end)]
+    return Response({"start": start, "end": end, "enrollments_per_day": days})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+def submission_analytics_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+    try:
+        start, end = _date_range(request, 30)
+        assessment = int(request.GET['assessment']) if request.GET.get('assessment') else None
+    except ValueError:
+        return Response({'Error':'start and end must be dates (YYYY-MM-DD), assessment an id'},status=400)
+
+    days = [
+        {"assessment": row['key'], "day": row['day'], "submissions": row['count']}
+        for row in rollups.daily(rollups.SUBMISSIONS, start, end, key=assessment)
+    ]
+    return Response({"start": start, "end": end, "submissions_per_day": days})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def sponsorship_analytics_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+    try:
+        start, end = _date_range(request, 365)
+    except ValueError:
+        return Response({'Error':'start and end must be dates (YYYY-MM-DD), start before end'},status=400)
+
+    months = [
+        {"month": row['month'], "sponsorships": row['count'], "amount": row['total']}
+        for row in rollups.monthly(rollups.SPONSORSHIPS, start, end)
+    ]
+    return Response({"start": start, "end": end, "sponsorships_per_month": months})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mail_status_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+
+    # delivery status of the outbox so admins can see if the mail worker is keeping up
+    return Response(outbox_status())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def auth_cache_status_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+
+    # hit rate of the token cache, counted by the process that answers this request
+    return Response(token_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profiling_api(request):
+    if request.user.role != 'admin':
+        return Response({'Error':'You are not an admin user'},status=403)
+
+    # per view numbers of the sampled requests of this process, ?output=prometheus for the scraper
+    if request.query_params.get('output') == 'prometheus':
+        return HttpResponse(profiling.registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return Response({'enabled': profiling.config()['ENABLED'], 'views': profiling.registry.summary()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_api(request, dataset):
+    if request.user.role not in ('instructor', 'admin'):
+        return Response({'Forbidden':'Only instructors and admins can export'},status=403)
+    if dataset not in DATASETS:
+        return Response({'Error':f'dataset must be one of {", ".join(DATASETS)}'},status=404)
+
+    # ?output= because drf already uses ?format= to pick a renderer
+    output = request.GET.get('output', 'csv')
+    compress = request.GET.get('compress') in ('1', 'true', 'gzip')
+    course = request.GET.get('course')
+    if output not in FORMATS or (course and not course.isdigit()):
+        return Response({'Error':f'output must be one of {", ".join(FORMATS)}, course a course id'},status=400)
+
+    # rows are read and written while the response is sent, memory does not grow with the export
+    stream = export_stream(dataset, request.user, output=output, compress=compress, course=int(course) if course else None)
+    filename = f'{dataset}.{output}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(stream, content_type='application/gzip' if compress else FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
 def sponsor_dashboard_api(request):
     if request.user.role != 'sponsor':
         return Response({"error": "Permission denied"}, status=403)
@@ -325,55 +527,138 @@ def sponsor_dashboard_api(request):
     filter_progress = request.GET.get('progress_percentage')
     filter_courses = request.GET.get('courses_enrolled')
 
-    sponsorships = Sponsor.objects.filter(sponsor=request.user).select_related('student')
-    student_progress = []
-
-    for sponsorship in sponsorships:
-        student = sponsorship.student
-        courses = Course.objects.filter(enrollment__student=student).distinct()
-
-        total_assessments = Assessment.objects.filter(course__in=courses).count()
-        completed_assessments = StudentProgress.objects.filter(
-            student=student,
-            is_completed=True
-        ).count()
-
-        progress_percentage = 0
-        if total_assessments > 0:
-            progress_percentage = round((completed_assessments / total_assessments) * 100, 2)
-
-        courses_enrolled = courses.count()
-
-        #using loop to filter because sponsor will have ease in using dashboard.
-        if filter_progress and progress_percentage != float(filter_progress):
-            continue
-        if filter_courses and courses_enrolled != int(filter_courses):
-            continue
-
-        student_progress.append({
-            "student_id": student.id,
-            "student_name": student.username,
-            "total_assessments": total_assessments,
-            "completed_assessments": completed_assessments,
-            "progress_percentage": progress_percentage,
-            "total_funds": float(sponsorship.amount),
-            "course_enrolled": courses_enrolled,
-        })
+    try:
+        filter_progress = Decimal(filter_progress) if filter_progress else None
+        filter_courses = int(filter_courses) if filter_courses else None
+    except (InvalidOperation, ValueError):
+        return Response({"error": "progress_percentage and courses_enrolled must be numbers"}, status=400)
+
+    # the whole dashboard is computed by the database, see base/dashboards.py
+    sponsorships = sponsored_students(request.user, progress_percentage=filter_progress, courses_enrolled=filter_courses)
+    student_progress = [
+        {
+            "student_id": row['student_id'],
+            "student_name": row['student_name'],
+            "total_assessments": row['total_assessments'],
+            "completed_assessments": row['completed_assessments'],
+            "progress_percentage": float(row['progress_percentage']),
+            "total_funds": float(row['amount']),
+            "course_enrolled": row['courses_enrolled'],
+        }
+        for row in sponsorships
+    ]
 
     return Response({
         "sponsored_students": student_progress
     })
 
-class NotificationView(GenericAPIView):
-    queryset = Notification.objects.all()
-    serializer_class = NotificationSerialiser
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notification_unread_api(request):
+    # served from the denormalized counter, no count over the notifications
+    return Response({'unread': unread_count(request.user)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def gradebook_upload_api(request):
+    # multipart upload of a csv/xlsx gradebook in the `gradebook` field, see base/gradebook.py for the columns
+    if request.user.role != 'instructor':
+        return Response({'Forbidden': 'Only instructors can upload grades'}, status=403)
+    upload = request.FILES.get('gradebook')
+    if upload is None:
+        return Response({'Error': 'gradebook file is required'}, status=400)
+    try:
+        result = Import(request.user).run(read_gradebook(upload))
+    except GradebookError as error:
+        return Response({'Error': str(error)}, status=400)
+    return Response(result, status=200)
 
-    def get(self):
-        #only notifications for currently logged in user
-        return Notification.objects.filter(User=self.request.user)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_start_api(request):
+    # {"target": "submission"|"assessment", "assessment": id, "filename": ..., "size": bytes}, see base/uploads.py
+    target = request.data.get('target')
+    size = request.data.get('size')
+    filename = request.data.get('filename')
+    if target not in ('submission', 'assessment') or type(size) is not int or not isinstance(filename, str):
+        return Response({'Error':'target (submission or assessment), assessment, filename and size are required'},status=400)
+    try:
+        assessment = Assessment.objects.select_related('course').get(pk=request.data.get('assessment'))
+    except (Assessment.DoesNotExist, ValueError, TypeError):
+        return Response({'Error':'Assessment not found'},status=404)
+    try:
+        session = uploads.start(request.user, target, assessment, filename, size)
+    except uploads.UploadError as error:
+        return Response({'Error':str(error)},status=error.status)
+    return Response(uploads.status(session),status=201)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_api(request, pk):
+    # GET: where to resume, PUT: the next chunk (Content-Range and X-Chunk-SHA256 headers), DELETE: give up
+    session = UploadSession.objects.filter(pk=pk, user=request.user).first()
+    if session is None:
+        return Response({'Error':'Upload not found'},status=404)
+    if request.method == 'GET':
+        return Response(uploads.status(session))
+    if request.method == 'DELETE':
+        uploads.cancel(session)
+        return Response(status=204)
+    try:
+        # the raw body is read in small blocks, request.data would parse the whole chunk first
+        session = uploads.write_chunk(pk, request.user, request.stream, request.headers.get('Content-Range'), request.headers.get('X-Chunk-SHA256'))
+    except uploads.UploadError as error:
+        session.refresh_from_db()
+        return Response({'Error':str(error), **uploads.status(session)},status=error.status)
+    return Response(uploads.status(session))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def assessment_file_api(request, pk):
+    # whoever sees the assessment in AssessmentListCreateView may download its file
+    assessment = Assessment.objects.filter(pk=pk).select_related('course').only('file', 'course__instructor_id').first()
+    if assessment is None:
+        return Response({'Error':'Assessment not found'},status=404)
+    user = request.user
+    if user.role == 'student':
+        allowed = Enrollment.objects.filter(course_id=assessment.course_id, student=user).exists()
+    else:
+        allowed = user.role == 'instructor' and assessment.course.instructor_id == user.id
+    if not allowed:
+        return Response({'Forbidden':'You cannot download this file'},status=403)
+    return serve(request, assessment.file) or Response({'Error':'File not found'},status=404)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def submission_file_api(request, pk):
+    # the instructor who sees it in SubmissionView, and the student who submitted it
+    submission = Submission.objects.filter(pk=pk).only('add_file', 'submitted_by_id', 'assessment__created_by_id').select_related('assessment').first()
+    if submission is None:
+        return Response({'Error':'Submission not found'},status=404)
+    user = request.user
+    if not (user.role == 'instructor' and submission.assessment.created_by_id == user.id or submission.submitted_by_id == user.id):
+        return Response({'Forbidden':'You cannot download this file'},status=403)
+    return serve(request, submission.add_file) or Response({'Error':'File not found'},status=404)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def submission_archive_api(request, pk):
+    # every submission of an assessment in one zip, for the instructor who created it (like SubmissionView)
+    assessment = Assessment.objects.filter(pk=pk).only('title', 'created_by_id').first()
+    if assessment is None:
+        return Response({'Error':'Assessment not found'},status=404)
+    if request.user.role != 'instructor' or assessment.created_by_id != request.user.id:
+        return Response({'Forbidden':'Only the instructor of this assessment can download its submissions'},status=403)
+    response = StreamingHttpResponse(archive_stream(manifest(assessment.id)), content_type='application/zip')
+    filename = UNSAFE.sub('_', assessment.title) or 'assessment'
+    response['Content-Disposition'] = f'attachment; filename="{filename}-submissions.zip"'
+    return response
 
 class ProgressReportView(GenericAPIView):
     serializer_class = ProgressReportSerialiser
+    permission_classes = [IsAuthenticated]
 
     def post(self, request):
         user = request.user
@@ -396,27 +681,81 @@ class ProgressReportView(GenericAPIView):
             sponsor_instance.report_file = report_file
             sponsor_instance.save()
 
-            # Send email to sponsor
-            subject = f"Progress Report Uploaded for {student.username}"
-            email_sponsor = EmailMessage(
-                subject,
-                f"A new progress report for {student.username} has been uploaded.",
-                settings.DEFAULT_FROM_EMAIL,
-                [sponsor.email]
+            # small reports still go as an attachment, bigger ones as a signed link so the mail worker
+            # never loads them into memory. the mail itself is sent by the outbox worker, not in this request
+            message = f"A new progress report for {student.username} has been uploaded."
+            attachment = ''
+            if report_file.size <= settings.REPORT_ATTACHMENT_MAX_SIZE:
+                attachment = sponsor_instance.report_file.name
+            else:
+                link = request.build_absolute_uri(reverse('progress_report_download', args=[report_token(sponsor_instance)]))
+                days = REPORT_LINK_MAX_AGE // (24 * 3600)
+                message += f"\n\nDownload it here, the link works for {days} days:\n{link}"
+            queue_mail(
+                f"Progress Report Uploaded for {student.username}",
+                message,
+                [sponsor.email],
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                attachment=attachment,
             )
-            email_sponsor.attach(report_file.name, report_file.read(), report_file.content_type)
-            email_sponsor.send()
 
             return Response({'message': 'Report uploaded. Email sent to sponsor.'}, status=201)
 
         return Response(serializer.errors, status=400)
 
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def progress_report_download_api(request, token):
+    # the signed token from the sponsor's mail is the permission, it stops working when it expires
+    # or when a newer report replaced the file it was made for
+    try:
+        sponsor_id, name = read_report_token(token)
+    except signing.SignatureExpired:
+        return Response({'Error':'This link has expired'},status=410)
+    except signing.BadSignature:
+        return Response({'Error':'Invalid link'},status=404)
+    sponsor = Sponsor.objects.filter(pk=sponsor_id).only('report_file').first()
+    if sponsor is None or sponsor.report_file.name != name:
+        return Response({'Error':'This report is no longer available'},status=410)
+    return serve(request, sponsor.report_file) or Response({'Error':'File not found'},status=404)
+
 class NotificationView(GenericAPIView):
-    queryset = Notification.objects.all()
-    serializer_class = NotificationSerialiser
+    serializer_class = NotificationFeedSerialiser
     permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
 
     def get(self,request):
-        model = self.get_queryset()
-        serializers = self.get_serializer(model,many = True)
-        return Response(serializers.data,status=200)
\ No newline at end of file
+        #only notifications for currently logged in user, newest first, one page per request
+        try:
+            cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+            page_size = int(request.GET.get('page_size', self.page_size))
+        except ValueError:
+            return Response({'error': 'Invalid cursor or page_size'}, status=400)
+        page_size = max(1, min(page_size, self.max_page_size))
+        unread_only = request.GET.get('unread') in ('1', 'true')
+
+        items, next_cursor = feed(request.user, cursor=cursor, limit=page_size, unread_only=unread_only)
+        for item in items:
+            item['cursor'] = encode_cursor(item) # clients send this back to mark everything up to here as read
+
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(dict(zip(('time', 'kind', 'id'), next_cursor))))
+        serializers = self.get_serializer(items, many=True)
+        return Response({'unread': unread_count(request.user), 'next': next_url, 'results': serializers.data}, status=200)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def notification_mark_read_api(request):
+    # marks everything up to the item of the given cursor as read, or everything when no cursor is sent
+    until = None
+    if request.data.get('cursor'):
+        try:
+            until, _, _ = decode_cursor(request.data['cursor'])
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=400)
+    marked = mark_read(request.user, until)
+    return Response({'marked': marked, 'unread': unread_count(request.user)}, status=200)
\ No newline at end of file